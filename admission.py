@@ -0,0 +1,70 @@
+"""
+准入控制 - 系统饱和时在读取请求体之前拒绝新的处理请求，返回 429 和估算的 Retry-After
+
+依据三个信号：调度器排队深度、已提交未完成的ASR识别任务数、磁盘剩余空间
+"""
+
+import os
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Optional
+from asr_client_manager import ASR_MAX_CONCURRENCY
+
+# 排队任务数上限（交互与批量通道合计）
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", 20))
+# 已提交、尚未取得结果的ASR识别任务数上限
+ADMISSION_MAX_ASR_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_ASR_IN_FLIGHT", ASR_MAX_CONCURRENCY))
+# Retry-After 的上下限（秒）
+ADMISSION_RETRY_AFTER_MIN = int(os.getenv("ADMISSION_RETRY_AFTER_MIN", 5))
+ADMISSION_RETRY_AFTER_MAX = int(os.getenv("ADMISSION_RETRY_AFTER_MAX", 600))
+
+@dataclass
+class Rejection:
+    """拒绝原因和建议的重试等待秒数"""
+    reason: str
+    retry_after: int
+
+class AdmissionController:
+    """根据调度器、ASR客户端和存储状态决定是否接收新的处理请求"""
+
+    def __init__(self, scheduler, asr_clients, storage, sweep_interval: float,
+                 queue_depth: Optional[Callable[[], int]] = None):
+        self.scheduler = scheduler
+        # 队列模式下排队深度来自共享队列
+        self.queue_depth = queue_depth or (lambda: scheduler.queued)
+        # 队列模式下识别在 worker 进程中进行，本进程的识别任务数恒为 0，不作为信号；
+        # worker 的处理能力由其并发数限制，饱和时体现为共享队列的排队深度
+        self.asr_clients = asr_clients if queue_depth is None else None
+        self.storage = storage
+        # 磁盘不足时，下一次周期清理可能释放空间
+        self.sweep_interval = sweep_interval
+
+    def _clamp(self, seconds: float) -> int:
+        return int(min(max(seconds, ADMISSION_RETRY_AFTER_MIN), ADMISSION_RETRY_AFTER_MAX))
+
+    async def check(self, content_length: int = 0) -> Optional[Rejection]:
+        """返回 None 表示接收，否则返回拒绝原因"""
+        bulk = self.scheduler.lanes["bulk"]
+
+        loop = asyncio.get_running_loop()
+        # 队列模式下需要查询共享数据库，可能等待其他进程的写锁
+        queued = await loop.run_in_executor(None, self.queue_depth)
+        if queued >= ADMISSION_MAX_QUEUED:
+            # 队列模式下本进程不运行任务，按超出的排队数和平均运行时长估计
+            excess = (queued - ADMISSION_MAX_QUEUED + 1) * bulk.average_runtime / max(bulk.max_concurrency, 1)
+            return Rejection(f"排队任务已满（{queued} 个）", self._clamp(max(bulk.estimated_wait(), excess)))
+
+        in_flight = self.asr_clients.in_flight if self.asr_clients is not None else 0
+        if in_flight >= ADMISSION_MAX_ASR_IN_FLIGHT:
+            # 新任务至少要等一个正在运行的任务完成才会开始识别
+            return Rejection(f"语音识别繁忙（{in_flight} 个识别任务进行中）",
+                             self._clamp(bulk.average_runtime / max(bulk.max_concurrency, 1)))
+
+        if self.storage.free_bytes() - content_length < self.storage.min_free_bytes:
+            # 先尝试淘汰过期和最久未用的产物，仍不足才拒绝
+            await loop.run_in_executor(None, self.storage.enforce, content_length)
+            free = self.storage.free_bytes()
+            if free - content_length < self.storage.min_free_bytes:
+                return Rejection(f"磁盘剩余空间不足（剩余 {free / (1024*1024):.0f} MB）",
+                                 self._clamp(self.sweep_interval))
+        return None
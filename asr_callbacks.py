@@ -0,0 +1,87 @@
+"""
+腾讯云ASR回调 - 识别任务完成登记表，把回调推送的结果交给等待中的识别线程
+
+配置 ASR_CALLBACK_URL 后，CreateRecTask 携带回调地址，识别完成时腾讯云主动推送结果；
+DescribeTaskStatus 轮询只作为回调丢失时的低频兜底
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# 保留尚无人等待的完成结果（回调可能早于等待开始到达）
+MAX_UNCLAIMED = 1000
+
+@dataclass
+class AsrCompletion:
+    """一个识别任务的最终结果，status 与 DescribeTaskStatus 一致: 2 成功，3 失败"""
+    task_id: int
+    status: int
+    result: str = ""
+    error_msg: str = ""
+    result_detail: List[Dict] = field(default_factory=list)  # 逐句详细结果（含词级时间戳）
+
+class CompletionRegistry:
+    """TaskId -> 完成结果 的登记表，识别线程阻塞等待，回调接口负责唤醒"""
+
+    def __init__(self):
+        self._completions: "OrderedDict[int, AsrCompletion]" = OrderedDict()
+        self._events: Dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def _event(self, task_id: int) -> threading.Event:
+        event = self._events.get(task_id)
+        if event is None:
+            event = self._events[task_id] = threading.Event()
+        return event
+
+    def complete(self, completion: AsrCompletion):
+        """登记完成结果并唤醒等待者"""
+        with self._lock:
+            self._completions[completion.task_id] = completion
+            self._completions.move_to_end(completion.task_id)
+            while len(self._completions) > MAX_UNCLAIMED:
+                stale_id, _ = self._completions.popitem(last=False)
+                self._events.pop(stale_id, None)
+            self._event(completion.task_id).set()
+
+    def wait(self, task_id: int, timeout: float) -> Optional[AsrCompletion]:
+        """等待任务完成，超时返回 None"""
+        with self._lock:
+            event = self._event(task_id)
+        event.wait(timeout)
+        with self._lock:
+            return self._completions.get(task_id)
+
+    def waiting(self) -> List[int]:
+        """正在等待、尚未收到结果的任务ID"""
+        with self._lock:
+            return [task_id for task_id in self._events if task_id not in self._completions]
+
+    def discard(self, task_id: int):
+        """任务结束（无论结果来自回调还是轮询）后清理登记"""
+        with self._lock:
+            self._completions.pop(task_id, None)
+            self._events.pop(task_id, None)
+
+def parse_callback(form: Dict[str, str]) -> AsrCompletion:
+    """
+    解析腾讯云录音文件识别回调（application/x-www-form-urlencoded）
+
+    主要字段: code（0 为成功）、message、requestId（即 TaskId）、text，
+    以及 ResTextFormat 不为 0 时的 resultDetail（SentenceDetail 列表的 JSON）
+    """
+    code = int(form.get("code", -1))
+    try:
+        result_detail = json.loads(form.get("resultDetail") or "[]")
+    except json.JSONDecodeError:
+        result_detail = []
+    return AsrCompletion(
+        task_id=int(form["requestId"]),
+        status=2 if code == 0 else 3,
+        result=form.get("text", ""),
+        error_msg=form.get("message", ""),
+        result_detail=result_detail if isinstance(result_detail, list) else [],
+    )
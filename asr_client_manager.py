@@ -0,0 +1,245 @@
+"""
+腾讯云ASR客户端管理 - 复用长连接客户端，AIMD 自适应并发、重试预算和熔断器
+"""
+
+import os
+import time
+import random
+import threading
+from typing import List, Optional, Set
+from tencentcloud.common import credential
+from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
+from tencentcloud.common.profile.client_profile import ClientProfile
+from tencentcloud.common.profile.http_profile import HttpProfile
+from tencentcloud.asr.v20190614 import asr_client
+
+# 限流错误码：收到后并发减半
+THROTTLE_CODE_PREFIXES = ("RequestLimitExceeded", "LimitExceeded")
+# 可重试的临时错误码：网络错误和服务端错误
+TRANSIENT_CODE_PREFIXES = ("ClientNetworkError", "InternalError", "ServiceUnavailable", "ResourceUnavailable")
+
+ASR_MIN_CONCURRENCY = int(os.getenv("ASR_MIN_CONCURRENCY", 1))
+ASR_MAX_CONCURRENCY = int(os.getenv("ASR_MAX_CONCURRENCY", 16))
+ASR_RETRY_RATIO = float(os.getenv("ASR_RETRY_RATIO", 0.2))
+ASR_BREAKER_THRESHOLD = int(os.getenv("ASR_BREAKER_THRESHOLD", 5))
+ASR_BREAKER_RESET_SECONDS = float(os.getenv("ASR_BREAKER_RESET_SECONDS", 30))
+# 接口地址，可指向本地的替身服务，如 "http://127.0.0.1:9000"
+ASR_ENDPOINT = os.getenv("ASR_ENDPOINT", "asr.tencentcloudapi.com")
+
+class CircuitOpenError(Exception):
+    """熔断器打开，请求被直接拒绝"""
+    pass
+
+class CircuitBreaker:
+    """
+    连续失败达到阈值后打开，在冷却期内直接拒绝请求；
+    冷却结束后进入半开状态，只放行一个探测请求
+    """
+
+    def __init__(self, failure_threshold: int = ASR_BREAKER_THRESHOLD,
+                 reset_timeout: float = ASR_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"  # "closed", "open", "half_open"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """结果不能说明服务是否恢复（限流、参数错误）时，只释放探测名额，保持当前状态"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"腾讯云ASR熔断器打开，{self.reset_timeout:.0f} 秒内直接拒绝请求")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+class AIMDLimiter:
+    """加性增、乘性减的并发限制：成功时缓慢增加并发，遇到限流时减半"""
+
+    def __init__(self, initial: float = 4, minimum: int = ASR_MIN_CONCURRENCY,
+                 maximum: int = ASR_MAX_CONCURRENCY):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            # 每完成约 limit 个请求并发加一
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify()
+
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(float(self.minimum), self.limit / 2)
+            print(f"腾讯云ASR限流，并发降为 {int(self.limit)}")
+
+class RetryBudget:
+    """重试预算：每个请求存入 ratio 个令牌，每次重试消耗一个，防止重试放大故障"""
+
+    def __init__(self, ratio: float = ASR_RETRY_RATIO, min_tokens: float = 3, max_tokens: float = 20):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = float(min_tokens)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+class TencentASRClientManager:
+    """
+    共享的腾讯云ASR客户端池
+
+    客户端开启 keep-alive 并在请求间复用；所有调用都经过熔断器、
+    AIMD 并发限制和重试预算
+    """
+
+    def __init__(self, secret_id: str, secret_key: str, region: str = ""):
+        self.secret_id = secret_id
+        self.secret_key = secret_key
+        self.region = region
+        self.breaker = CircuitBreaker()
+        self.limiter = AIMDLimiter()
+        self.retry_budget = RetryBudget()
+        self._idle_clients: List[asr_client.AsrClient] = []
+        # 已提交、尚未取得结果的识别任务ID
+        self._pending_tasks: Set[int] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        """
+        进行中的识别任务数：已提交但尚未取得结果的任务，加上正在提交的请求
+
+        识别在腾讯云侧异步进行，HTTP 请求本身很快结束，只统计请求数会低估负载
+        """
+        with self._lock:
+            return len(self._pending_tasks) + self.limiter.in_flight
+
+    def task_submitted(self, task_id: int):
+        with self._lock:
+            self._pending_tasks.add(task_id)
+
+    def task_finished(self, task_id: int):
+        with self._lock:
+            self._pending_tasks.discard(task_id)
+
+    def _new_client(self) -> asr_client.AsrClient:
+        cred = credential.Credential(self.secret_id, self.secret_key)
+        scheme, _, host = ASR_ENDPOINT.rpartition("://")
+        httpProfile = HttpProfile(protocol=scheme or "https", endpoint=host, keepAlive=True)
+
+        clientProfile = ClientProfile()
+        clientProfile.httpProfile = httpProfile
+        return asr_client.AsrClient(cred, self.region, clientProfile)
+
+    def _checkout(self) -> asr_client.AsrClient:
+        with self._lock:
+            if self._idle_clients:
+                return self._idle_clients.pop()
+        return self._new_client()
+
+    def _checkin(self, client: asr_client.AsrClient):
+        with self._lock:
+            self._idle_clients.append(client)
+
+    def call(self, method: str, request, max_retries: int = 3):
+        """
+        调用 AsrClient 的方法（如 "CreateRecTask"）
+
+        熔断器打开时抛出 CircuitOpenError；限流和临时错误在预算内退避重试
+        """
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("腾讯云ASR熔断中，请求被拒绝")
+
+            self.limiter.acquire()
+            client = self._checkout()
+            try:
+                response = getattr(client, method)(request)
+            except TencentCloudSDKException as e:
+                code = e.get_code() or ""
+                throttled = code.startswith(THROTTLE_CODE_PREFIXES)
+                transient = code.startswith(TRANSIENT_CODE_PREFIXES)
+
+                if throttled:
+                    self.limiter.on_throttle()
+                    self.breaker.release_probe()
+                elif transient:
+                    self.breaker.record_failure()
+                else:
+                    # 参数错误等不可重试的错误不代表服务故障
+                    self.breaker.release_probe()
+                    raise
+
+                if attempt >= max_retries or not self.retry_budget.try_withdraw():
+                    raise
+            except Exception:
+                # 连接失败等 SDK 之外的异常按服务故障记录，同时结束半开探测
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                self.limiter.on_success()
+                return response
+            finally:
+                self._checkin(client)
+                self.limiter.release()
+
+            attempt += 1
+            backoff = min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"腾讯云ASR请求 {method} 失败，{backoff:.1f} 秒后重试 ({attempt}/{max_retries})")
+            time.sleep(backoff)
@@ -0,0 +1,214 @@
+"""
+语音识别提供者 - 统一的识别接口，支持腾讯云、SpeechRecognition 和离线本地引擎
+
+通过环境变量选择:
+    ASR_PROVIDER           主识别提供者，默认 tencent
+    ASR_FALLBACK_PROVIDER  主提供者不可用或识别出错时的备选，默认 speech_recognition
+
+本地引擎依赖的 faster-whisper 是可选依赖，未安装或导入失败时该提供者不可用
+"""
+
+import os
+import sys
+import time
+import wave
+import importlib.util
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from word_timing import TimedText
+
+# 本地引擎配置（可选依赖，需要 pip install faster-whisper）
+LOCAL_MODEL = os.getenv("ASR_LOCAL_MODEL", "small")
+LOCAL_COMPUTE_TYPE = os.getenv("ASR_LOCAL_COMPUTE_TYPE", "int8")
+LOCAL_WORKERS = int(os.getenv("ASR_LOCAL_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+LOCAL_WINDOW_SECONDS = int(os.getenv("ASR_LOCAL_WINDOW_SECONDS", 60))
+
+# 逐块回调：每完成一块音频就以绝对时间戳传出该块的识别结果
+ChunkCallback = Optional[Callable[[List[Tuple[str, float, float]]], None]]
+
+class ASRProvider(ABC):
+    """
+    识别提供者接口：输入16kHz单声道WAV，输出 (文本, 开始秒, 结束秒) 列表
+
+    支持分块识别的提供者在每块完成时调用 on_chunk，返回值仍是完整结果
+    """
+
+    name = ""
+
+    def available(self) -> bool:
+        """当前环境是否可以使用该提供者"""
+        return True
+
+    @abstractmethod
+    def recognize(self, audio_path: str, on_chunk: ChunkCallback = None) -> List[Tuple[str, float, float]]:
+        pass
+
+class TencentProvider(ASRProvider):
+    """腾讯云录音文件识别"""
+
+    name = "tencent"
+
+    def __init__(self, processor):
+        self.processor = processor
+
+    def available(self) -> bool:
+        return bool(self.processor.secret_id and self.processor.secret_key)
+
+    def recognize(self, audio_path: str, on_chunk: ChunkCallback = None) -> List[Tuple[str, float, float]]:
+        return self.processor.recognize_speech_tencent(audio_path, on_chunk)
+
+class SpeechRecognitionProvider(ASRProvider):
+    """SpeechRecognition 库（调用 Google Web Speech API）"""
+
+    name = "speech_recognition"
+
+    def __init__(self, processor):
+        self.processor = processor
+
+    def available(self) -> bool:
+        return importlib.util.find_spec("speech_recognition") is not None
+
+    def recognize(self, audio_path: str, on_chunk: ChunkCallback = None) -> List[Tuple[str, float, float]]:
+        return self.processor._fallback_local_recognition(audio_path, on_chunk)
+
+# 每个工作进程只加载一次模型
+_local_model = None
+
+def _load_local_model(model_size: str, compute_type: str):
+    global _local_model
+    if _local_model is None:
+        from faster_whisper import WhisperModel
+        _local_model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=1)
+    return _local_model
+
+def _transcribe_window(audio_path: str, start: float, end: float,
+                       model_size: str, compute_type: str) -> List[Tuple[str, float, float]]:
+    """在工作进程中识别 [start, end) 秒的音频窗口，返回绝对时间戳"""
+    import numpy as np
+
+    with wave.open(audio_path, "rb") as wav:
+        sample_rate = wav.getframerate()
+        wav.setpos(int(start * sample_rate))
+        frames = wav.readframes(int((end - start) * sample_rate))
+    samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+
+    model = _load_local_model(model_size, compute_type)
+    segments, _ = model.transcribe(samples, language="zh", vad_filter=True, beam_size=1, word_timestamps=True)
+    return [
+        TimedText(
+            segment.text.strip(), start + segment.start, start + segment.end,
+            [(word.word, start + word.start, start + word.end) for word in segment.words or []]
+        )
+        for segment in segments
+        if segment.text.strip()
+    ]
+
+class LocalEngineProvider(ASRProvider):
+    """
+    离线 CPU 识别引擎（faster-whisper）
+
+    音频按固定窗口切分，由本地进程池并行识别，吞吐量只取决于本机 CPU
+    """
+
+    name = "local"
+
+    def __init__(self, processor=None, model_size: str = LOCAL_MODEL,
+                 compute_type: str = LOCAL_COMPUTE_TYPE, workers: int = LOCAL_WORKERS):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._available: Optional[bool] = None
+
+    def available(self) -> bool:
+        """faster-whisper 能否导入（已安装但其原生依赖缺失时同样不可用）"""
+        if self._available is None:
+            try:
+                import faster_whisper  # noqa: F401
+                self._available = True
+            except Exception as e:
+                print(f"本地识别引擎不可用: {e}")
+                self._available = False
+        return self._available
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # 进程池常驻，模型在每个进程中只加载一次
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def recognize(self, audio_path: str, on_chunk: ChunkCallback = None) -> List[Tuple[str, float, float]]:
+        with wave.open(audio_path, "rb") as wav:
+            duration = wav.getnframes() / float(wav.getframerate())
+
+        windows = []
+        start = 0.0
+        while start < duration:
+            end = min(start + LOCAL_WINDOW_SECONDS, duration)
+            windows.append((start, end))
+            start = end
+
+        print(f"本地引擎识别: {len(windows)} 个窗口，{self.workers} 个进程")
+        executor = self._get_executor()
+        futures = [
+            executor.submit(_transcribe_window, audio_path, start, end, self.model_size, self.compute_type)
+            for start, end in windows
+        ]
+
+        results = []
+        for future in futures:
+            window_results = future.result()
+            results.extend(window_results)
+            if on_chunk and window_results:
+                on_chunk(window_results)
+        return results
+
+PROVIDERS = {
+    TencentProvider.name: TencentProvider,
+    SpeechRecognitionProvider.name: SpeechRecognitionProvider,
+    LocalEngineProvider.name: LocalEngineProvider,
+}
+
+def create_provider(name: str, processor) -> ASRProvider:
+    """按名称创建识别提供者"""
+    if name not in PROVIDERS:
+        raise ValueError(f"未知的识别提供者: {name}，可选: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](processor)
+
+def benchmark(provider: ASRProvider, audio_path: str) -> Dict:
+    """识别一个文件并统计实时率（处理耗时 / 音频时长）"""
+    with wave.open(audio_path, "rb") as wav:
+        duration = wav.getnframes() / float(wav.getframerate())
+
+    started = time.perf_counter()
+    results = provider.recognize(audio_path)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "provider": provider.name,
+        "audio_seconds": duration,
+        "elapsed_seconds": elapsed,
+        "realtime_factor": elapsed / duration if duration else 0.0,
+        "segments": len(results),
+    }
+
+if __name__ == "__main__":
+    # 离线基准测试: python asr_providers.py audio_16k.wav [provider]
+    if len(sys.argv) < 2:
+        print("用法: python asr_providers.py <16kHz单声道WAV> [provider]")
+        sys.exit(1)
+
+    provider_name = sys.argv[2] if len(sys.argv) > 2 else LocalEngineProvider.name
+    processor = None
+    if provider_name != LocalEngineProvider.name:
+        from video_processor import VideoProcessor
+        processor = VideoProcessor()
+    provider = create_provider(provider_name, processor)
+    if not provider.available():
+        print(f"提供者 {provider_name} 在当前环境不可用")
+        sys.exit(1)
+
+    stats = benchmark(provider, sys.argv[1])
+    for key, value in stats.items():
+        print(f"{key}: {value}")
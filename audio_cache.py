@@ -0,0 +1,63 @@
+"""
+提取音频缓存 - 按源文件内容为识别用的16kHz PCM建立缓存，重新处理和局部重新识别直接复用
+
+缓存文件登记为 "audio" 类型产物，随 StorageManager 的 TTL 过期，
+总大小超过 AUDIO_CACHE_MAX_BYTES 时按最近最少使用淘汰
+"""
+
+import os
+import hashlib
+from typing import Optional
+from storage_manager import StorageManager
+
+AUDIO_CACHE_PREFIX = "audio_"
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+# 内容键只读取文件首尾各 1MB 和文件大小，避免对大文件做完整哈希
+SAMPLE_BYTES = 1024 * 1024
+
+def content_key(path: str) -> str:
+    """根据文件大小和首尾内容计算缓存键"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(SAMPLE_BYTES))
+        if size > SAMPLE_BYTES:
+            f.seek(max(SAMPLE_BYTES, size - SAMPLE_BYTES))
+            digest.update(f.read(SAMPLE_BYTES))
+    return digest.hexdigest()[:24]
+
+class AudioCache:
+    """源文件内容键 -> 已提取音频 的磁盘缓存"""
+
+    def __init__(self, cache_dir: str, storage: StorageManager, max_bytes: int = AUDIO_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.storage = storage
+        self.max_bytes = max_bytes
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{AUDIO_CACHE_PREFIX}{key}.wav")
+
+    def contains(self, path: str) -> bool:
+        """path 是否是缓存中的文件"""
+        name = os.path.basename(path)
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.cache_dir) \
+            and name.startswith(AUDIO_CACHE_PREFIX)
+
+    def get(self, source_path: str, owner: str) -> Optional[str]:
+        """返回源文件已提取的音频，未命中返回 None"""
+        path = self.path_for(content_key(source_path))
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        # 重新登记到当前视频名下，处理期间随视频一起受保护，同时刷新访问时间
+        self.storage.register(path, owner, "audio")
+        print(f"命中音频缓存: {path}")
+        return path
+
+    def put(self, source_path: str, audio_path: str, owner: str) -> str:
+        """把新提取的音频移入缓存并返回缓存路径"""
+        path = self.path_for(content_key(source_path))
+        os.replace(audio_path, path)
+        self.storage.register(path, owner, "audio")
+        self.storage.evict_kind("audio", self.max_bytes)
+        return path
@@ -0,0 +1,305 @@
+"""
+共享任务队列 - 多节点部署时，API 节点把处理任务写入共享的 SQLite 队列，
+任意数量的 worker（worker.py）领取任务并运行处理流程
+
+worker 领取任务时获得租约，处理期间定时心跳续约并回写进度和已生成的片段；
+worker 崩溃或失联后租约过期，任务由其他 worker 重新领取，并从检查点继续
+
+腾讯云识别回调只会到达 API 节点，API 节点把结果写入队列数据库，由等待该任务的 worker 取走
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from array import array
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from models import Database, TranscriptSegment
+from keyframe_index import KeyframeIndex
+from asr_callbacks import AsrCompletion
+from storage_manager import STATE_DIR
+from word_timing import WordTimingIndex
+
+# 队列数据库路径，多台主机时放在共享文件系统上
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(STATE_DIR, "queue.db"))
+# 租约时长与心跳间隔（秒），心跳间隔应明显小于租约
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 60))
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", 15))
+# 一个任务最多被领取的次数，超过后标记为失败
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+# 与调度器一致：短任务优先，等待每秒抵消的成本秒数
+JOB_AGING_RATE = float(os.getenv("SCHEDULER_AGING_RATE", 10))
+# 无人取走的识别回调结果保留的秒数（等待的 worker 已超时或崩溃）
+COMPLETION_RETENTION_SECONDS = 24 * 3600
+
+@dataclass
+class QueuedJob:
+    """队列中的一个处理任务"""
+    video_id: str
+    filename: str
+    file_path: str
+    size: int
+    upload_time: datetime
+    cost: float
+    status: str  # "queued", "running", "completed", "failed"
+    progress: int
+    message: str
+    attempts: int
+    revision: int  # 回写片段的版本号，每次回写加一
+    duration: float = 0.0
+    proxy_path: Optional[str] = None
+    waveform_path: Optional[str] = None
+    keyframes: Optional[str] = None  # 序列化的关键帧索引，见 dump_keyframes
+
+_COLUMNS = ("video_id, filename, file_path, size, upload_time, cost, status, progress, message, "
+            "attempts, revision, duration, proxy_path, waveform_path, keyframes")
+
+def _row_to_job(row) -> QueuedJob:
+    values = list(row)
+    values[4] = datetime.fromisoformat(values[4])
+    return QueuedJob(*values)
+
+class JobQueue:
+    """基于 SQLite 的持久任务队列，多进程、多主机共享同一个数据库文件"""
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, lease_seconds: int = JOB_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        # 共享文件系统上 WAL 依赖共享内存，不一定可用，使用默认的回滚日志
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS queue_jobs (
+                video_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                upload_time TEXT NOT NULL,
+                cost REAL NOT NULL,
+                status TEXT NOT NULL,
+                progress INTEGER NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                revision INTEGER NOT NULL DEFAULT 0,
+                duration REAL NOT NULL DEFAULT 0,
+                proxy_path TEXT,
+                waveform_path TEXT,
+                keyframes TEXT,
+                segments TEXT,
+                worker TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS queue_jobs_status ON queue_jobs (status, lease_until);
+            CREATE TABLE IF NOT EXISTS asr_completions (
+                task_id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+        """)
+        # 早期创建的队列数据库没有 keyframes 列
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(queue_jobs)")}
+        if "keyframes" not in columns:
+            self._conn.execute("ALTER TABLE queue_jobs ADD COLUMN keyframes TEXT")
+        self._lock = threading.Lock()
+
+    def enqueue(self, video, cost: float):
+        """加入队列；同一视频已有的任务（包括已完成的）被替换"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO queue_jobs (video_id, filename, file_path, size, upload_time, cost, "
+                "status, message, created_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', '排队等待处理', ?)",
+                (video.id, video.filename, video.file_path, video.size, video.upload_time.isoformat(),
+                 cost, time.time()),
+            )
+
+    def depth(self) -> int:
+        """等待领取的任务数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM queue_jobs WHERE status = 'queued'").fetchone()[0]
+
+    def active_ids(self) -> List[str]:
+        """等待中和运行中任务的视频ID，其上传文件不能被清理"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT video_id FROM queue_jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def position(self, video_id: str) -> Optional[int]:
+        """任务前面还有几个等待中的任务，不在等待中返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cost - ? * (? - created_at) FROM queue_jobs WHERE video_id = ? AND status = 'queued'",
+                (JOB_AGING_RATE, now, video_id),
+            ).fetchone()
+            if row is None:
+                return None
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM queue_jobs WHERE status = 'queued' AND cost - ? * (? - created_at) < ?",
+                (JOB_AGING_RATE, now, row[0]),
+            ).fetchone()[0]
+
+    def claim(self, worker: str) -> Optional[QueuedJob]:
+        """
+        领取一个任务：等待中的任务，或租约已过期的运行中任务
+
+        BEGIN IMMEDIATE 取得写锁，多个 worker 同时领取也不会拿到同一个任务
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 多次领取仍未完成的任务不再重试
+                self._conn.execute(
+                    "UPDATE queue_jobs SET status = 'failed', message = '处理失败: 多次重试后仍未完成', "
+                    "worker = NULL WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (now, JOB_MAX_ATTEMPTS),
+                )
+                row = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM queue_jobs "
+                    "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY cost - ? * (? - created_at) LIMIT 1",
+                    (now, JOB_AGING_RATE, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE queue_jobs SET status = 'running', worker = ?, lease_until = ?, "
+                    "attempts = attempts + 1 WHERE video_id = ?",
+                    (worker, now + self.lease_seconds, row[0]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = _row_to_job(row)
+        job.status = "running"
+        job.attempts += 1
+        return job
+
+    def heartbeat(self, video_id: str, worker: str, progress: int, message: str,
+                  segments: Optional[str] = None) -> bool:
+        """续约并回写进度；segments 不为 None 时同时回写片段。返回 False 表示租约已被他人接管"""
+        with self._lock:
+            if segments is None:
+                cursor = self._conn.execute(
+                    "UPDATE queue_jobs SET lease_until = ?, progress = ?, message = ? "
+                    "WHERE video_id = ? AND worker = ? AND status = 'running'",
+                    (time.time() + self.lease_seconds, progress, message, video_id, worker),
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE queue_jobs SET lease_until = ?, progress = ?, message = ?, segments = ?, "
+                    "revision = revision + 1 WHERE video_id = ? AND worker = ? AND status = 'running'",
+                    (time.time() + self.lease_seconds, progress, message, segments, video_id, worker),
+                )
+            return cursor.rowcount == 1
+
+    def finish(self, video_id: str, worker: str, status: str, message: str, segments: str,
+               duration: float, proxy_path: Optional[str], waveform_path: Optional[str],
+               keyframes: Optional[str] = None) -> bool:
+        """任务结束，回写最终片段、产物路径和关键帧索引"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE queue_jobs SET status = ?, progress = ?, message = ?, segments = ?, "
+                "revision = revision + 1, duration = ?, proxy_path = ?, waveform_path = ?, keyframes = ?, "
+                "worker = NULL WHERE video_id = ? AND worker = ?",
+                (status, 100 if status == "completed" else 0, message, segments, duration,
+                 proxy_path, waveform_path, keyframes, video_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def get(self, video_id: str) -> Optional[QueuedJob]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM queue_jobs WHERE video_id = ?",
+                                     (video_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def put_completion(self, completion: AsrCompletion):
+        """登记 API 节点收到的识别回调，顺带清理长期无人取走的结果"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO asr_completions (task_id, payload, created_at) VALUES (?, ?, ?)",
+                (completion.task_id, json.dumps(asdict(completion), ensure_ascii=False), now),
+            )
+            self._conn.execute("DELETE FROM asr_completions WHERE created_at < ?",
+                               (now - COMPLETION_RETENTION_SECONDS,))
+
+    def take_completions(self, task_ids: List[int]) -> List[AsrCompletion]:
+        """取走指定任务的识别回调结果"""
+        if not task_ids:
+            return []
+        placeholders = ",".join("?" * len(task_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT task_id, payload FROM asr_completions WHERE task_id IN ({placeholders})", task_ids
+            ).fetchall()
+            if rows:
+                self._conn.execute(
+                    f"DELETE FROM asr_completions WHERE task_id IN ({','.join('?' * len(rows))})",
+                    [row[0] for row in rows],
+                )
+        return [AsrCompletion(**json.loads(payload)) for _, payload in rows]
+
+    def segments(self, video_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT segments FROM queue_jobs WHERE video_id = ?",
+                                     (video_id,)).fetchone()
+        return row[0] if row else None
+
+def dump_transcript(video_id: str) -> str:
+    """序列化视频的片段和词级时间索引，用于在节点之间传递"""
+    items = []
+    for segment in Database.get_transcript(video_id):
+        index = Database.get_word_timing(video_id, segment.id)
+        items.append({
+            "id": segment.id,
+            "text": segment.text,
+            "start_time": segment.start_time,
+            "end_time": segment.end_time,
+            "order": segment.order,
+            "words": [list(index.offsets), list(index.starts), list(index.ends), index.text_length]
+                     if index is not None else None,
+        })
+    return json.dumps(items, ensure_ascii=False)
+
+def dump_keyframes(index: Optional[KeyframeIndex]) -> Optional[str]:
+    """序列化关键帧索引，API 节点据此提供关键帧查询和导出吸附"""
+    if index is None:
+        return None
+    return json.dumps([list(index.keyframes), index.packet_count])
+
+def load_keyframes(payload: Optional[str]) -> Optional[KeyframeIndex]:
+    if not payload:
+        return None
+    keyframes, packet_count = json.loads(payload)
+    return KeyframeIndex(array("d", keyframes), packet_count)
+
+def load_transcript(video_id: str, payload: str) -> List[TranscriptSegment]:
+    """用序列化的片段替换视频的转录"""
+    segments = []
+    timings: Dict[str, WordTimingIndex] = {}
+    for item in json.loads(payload or "[]"):
+        segments.append(TranscriptSegment(
+            id=item["id"],
+            video_id=video_id,
+            text=item["text"],
+            start_time=item["start_time"],
+            end_time=item["end_time"],
+            order=item["order"]
+        ))
+        if item.get("words"):
+            offsets, starts, ends, text_length = item["words"]
+            timings[item["id"]] = WordTimingIndex(array("I", offsets), array("d", starts),
+                                                  array("d", ends), text_length)
+    Database.add_transcript(video_id, segments)
+    for segment_id, index in timings.items():
+        Database.set_word_timing(video_id, segment_id, index)
+    return segments
@@ -0,0 +1,135 @@
+"""
+处理任务检查点 - 未完成的处理任务、所处阶段和已完成的识别块持久化到 SQLite，
+服务重启（每次部署）后从最后一个检查点继续，而不是让用户重新上传
+
+任务完成或失败后记录即删除，数据库里只保留需要恢复的任务
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Tuple
+from storage_manager import STATE_DIR
+from word_timing import TimedText, words_of
+
+# 检查点数据库路径，默认在持久磁盘上的状态目录中，重新部署后才能恢复任务
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(STATE_DIR, "jobs.db"))
+# 数据库放在多台主机共享的文件系统上（多个 worker 共用检查点）时设为 1
+JOB_STORE_SHARED = os.getenv("JOB_STORE_SHARED", "0") == "1"
+
+# 处理阶段
+STAGE_QUEUED = "queued"
+STAGE_EXTRACTING = "extracting"
+STAGE_TRANSCRIBING = "transcribing"
+
+@dataclass
+class JobRecord:
+    """一个未完成的处理任务"""
+    video_id: str
+    filename: str
+    file_path: str
+    size: int
+    upload_time: datetime
+    client: str
+    cost: float
+    stage: str
+
+class JobStore:
+    """未完成任务与识别块检查点，所有方法线程安全"""
+
+    def __init__(self, path: str = JOB_STORE_PATH, shared: bool = JOB_STORE_SHARED):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        if shared:
+            # 与共享任务队列相同：网络文件系统上 WAL 依赖的共享内存不可用，使用默认的回滚日志
+            self._conn.execute("PRAGMA journal_mode=DELETE")
+        else:
+            # WAL 下每次提交只追加日志，进程崩溃不丢已提交的检查点
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                video_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                upload_time TEXT NOT NULL,
+                client TEXT NOT NULL,
+                cost REAL NOT NULL,
+                stage TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                video_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                results TEXT NOT NULL,
+                PRIMARY KEY (video_id, seq)
+            );
+        """)
+        self._lock = threading.Lock()
+
+    def create(self, video, client: str, cost: float):
+        """登记新的处理任务，同一视频的旧检查点一并清除"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM chunks WHERE video_id = ?", (video.id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (video.id, video.filename, video.file_path, video.size, video.upload_time.isoformat(),
+                 client, cost, STAGE_QUEUED, time.time()),
+            )
+            self._conn.execute("COMMIT")
+
+    def set_stage(self, video_id: str, stage: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET stage = ?, updated_at = ? WHERE video_id = ?",
+                               (stage, time.time(), video_id))
+
+    def add_chunk(self, video_id: str, results: List[Tuple[str, float, float]]):
+        """保存一块已写入转录的识别结果（绝对时间，含词级时间戳）"""
+        rows = []
+        for result in results:
+            text, start, end = result
+            rows.append([text, start, end, words_of(result)])
+        payload = json.dumps(rows, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO chunks VALUES (?, (SELECT COUNT(*) FROM chunks WHERE video_id = ?), ?)",
+                (video_id, video_id, payload),
+            )
+
+    def chunks(self, video_id: str) -> List[List[TimedText]]:
+        """按保存顺序返回已完成的识别块"""
+        with self._lock:
+            rows = self._conn.execute("SELECT results FROM chunks WHERE video_id = ? ORDER BY seq",
+                                      (video_id,)).fetchall()
+        return [[TimedText(text, start, end, [tuple(word) for word in words])
+                 for text, start, end, words in json.loads(row[0])] for row in rows]
+
+    def clear_chunks(self, video_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE video_id = ?", (video_id,))
+
+    def finish(self, video_id: str):
+        """任务结束（完成或失败），删除记录和检查点"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM chunks WHERE video_id = ?", (video_id,))
+            self._conn.execute("DELETE FROM jobs WHERE video_id = ?", (video_id,))
+            self._conn.execute("COMMIT")
+
+    def unfinished(self) -> List[JobRecord]:
+        """上次运行中未完成的任务，按登记时间排序"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT video_id, filename, file_path, size, upload_time, client, cost, stage "
+                "FROM jobs ORDER BY upload_time"
+            ).fetchall()
+        return [JobRecord(video_id, filename, file_path, size, datetime.fromisoformat(upload_time),
+                          client, cost, stage)
+                for video_id, filename, file_path, size, upload_time, client, cost, stage in rows]
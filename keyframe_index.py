@@ -0,0 +1,66 @@
+"""
+关键帧索引 - 上传时探测一次视频流的包与关键帧时间戳，提供 O(log n) 的最近关键帧查询
+"""
+
+import subprocess
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Optional
+
+class KeyframeIndex:
+    """有序的关键帧时间戳数组（秒）"""
+
+    def __init__(self, keyframes: array, packet_count: int = 0):
+        self.keyframes = keyframes
+        self.packet_count = packet_count
+
+    @classmethod
+    def build(cls, video_path: str) -> "KeyframeIndex":
+        """用 ffprobe 读取第一个视频流的全部包时间戳和标志（只解析容器，不解码）"""
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-select_streams", "v:0",
+                "-show_entries", "packet=pts_time,flags",
+                "-of", "csv=p=0",
+                video_path
+            ],
+            capture_output=True, text=True, check=True
+        )
+
+        keyframes = array("d")
+        packet_count = 0
+        for line in result.stdout.splitlines():
+            pts_time, _, flags = line.partition(",")
+            if not pts_time or pts_time == "N/A":
+                continue
+            packet_count += 1
+            if "K" in flags:
+                keyframes.append(float(pts_time))
+
+        # 包按解码顺序输出，B帧会使时间戳乱序，关键帧本身一般有序，这里统一排序
+        keyframes = array("d", sorted(keyframes))
+        return cls(keyframes, packet_count)
+
+    def __len__(self) -> int:
+        return len(self.keyframes)
+
+    def nearest_before(self, t: float) -> Optional[float]:
+        """不晚于 t 的最后一个关键帧"""
+        i = bisect_right(self.keyframes, t)
+        return self.keyframes[i - 1] if i > 0 else None
+
+    def nearest_after(self, t: float) -> Optional[float]:
+        """不早于 t 的第一个关键帧"""
+        i = bisect_left(self.keyframes, t)
+        return self.keyframes[i] if i < len(self.keyframes) else None
+
+    def snap(self, t: float) -> float:
+        """吸附到距离 t 最近的关键帧，没有关键帧时返回 t"""
+        before = self.nearest_before(t)
+        after = self.nearest_after(t)
+        if before is None:
+            return after if after is not None else t
+        if after is None:
+            return before
+        return before if t - before <= after - t else after
@@ -2,12 +2,14 @@
 FastAPI 主应用 - 视频编辑器后端API
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import Response, JSONResponse
 import uuid
+import hmac
 import os
-from typing import List
+import asyncio
+from typing import Dict, List, Set
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -17,10 +19,18 @@ load_dotenv()
 from schemas import (
     VideoUploadResponse, TranscriptSegment, SegmentEdit, 
     ReorderRequest, ExportRequest, 
-    ExportResponse, ProcessingStatus
+    ExportResponse, ProcessingStatus, VideoInfo, MediaInfo,
+    RetranscribeRequest, RetranscribeResponse, SearchHit, SearchResponse
 )
 from models import Video, Database, ProcessingTask
-from video_processor import VideoProcessor
+from video_processor import VideoProcessor, ASR_CALLBACK_URL
+from file_serving import RangeFileResponse
+from storage_manager import StorageFullError, UPLOAD_DIR
+from waveform import PeakPyramid
+from asr_callbacks import parse_callback
+from scheduler import LaneScheduler, client_key
+from admission import AdmissionController
+from job_queue import JobQueue, load_transcript, load_keyframes
 
 # 初始化应用
 app = FastAPI(
@@ -29,6 +39,30 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# 准入控制 - 在 CORS 中间件之前注册，拒绝响应同样带有 CORS 头，前端可以读取 Retry-After
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """上传和重新处理在读取请求体之前检查系统负载，过载时返回 429"""
+    if request.method == "POST" and (request.url.path == "/upload" or request.url.path.endswith("/reprocess")):
+        try:
+            content_length = int(request.headers.get("content-length") or 0)
+            if content_length < 0:
+                raise ValueError(content_length)
+        except ValueError:
+            return JSONResponse(status_code=400, content={"detail": "无效的 Content-Length"})
+        rejection = await admission.check(content_length)
+        if rejection:
+            print(f"拒绝请求 {request.url.path}: {rejection.reason}，{rejection.retry_after} 秒后重试")
+            return JSONResponse(
+                status_code=429,
+                content={"detail": f"服务繁忙，请稍后再试: {rejection.reason}"},
+                headers={
+                    "Retry-After": str(rejection.retry_after),
+                    "Access-Control-Expose-Headers": "Retry-After",
+                },
+            )
+    return await call_next(request)
+
 # 添加CORS中间件 - 允许前端访问
 app.add_middleware(
     CORSMiddleware,
@@ -46,9 +80,139 @@ app.add_middleware(
 # 初始化视频处理器
 video_processor = VideoProcessor()
 
-# 创建上传目录
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# 处理和导出任务按客户端公平调度，短任务走交互通道
+scheduler = LaneScheduler()
+
+def media_seconds(video: Video) -> float:
+    """任务调度成本：媒体时长；上传时探测失败则按约 1Mbps 码率由文件大小估计"""
+    if video.duration > 0:
+        return video.duration
+    return video.size / (128 * 1024)
+
+# 处理模式: local 在本进程中处理；queue 写入共享队列，由 worker.py 处理
+PROCESSING_MODE = os.getenv("PROCESSING_MODE", "local")
+job_queue = JobQueue() if PROCESSING_MODE == "queue" else None
+# 已导入的队列片段版本: video_id -> revision
+_imported_revisions: Dict[str, int] = {}
+# 队列模式下等待或正在由 worker 处理的视频，其上传文件不参与清理
+_pinned_uploads: Set[str] = set()
+
+def _pin_upload(video_id: str):
+    if video_id not in _pinned_uploads:
+        _pinned_uploads.add(video_id)
+        video_processor.storage.acquire(video_id)
+
+async def _refresh_upload_pins():
+    """按共享队列中未结束的任务更新上传文件的占用标记"""
+    active = set(await asyncio.get_running_loop().run_in_executor(None, job_queue.active_ids))
+    for video_id in _pinned_uploads - active:
+        _pinned_uploads.discard(video_id)
+        video_processor.storage.release(video_id)
+    for video_id in active:
+        _pin_upload(video_id)
+
+async def submit_processing(request: Request, video: Video):
+    """登记检查点后按客户端排队处理；队列模式下写入共享队列"""
+    if job_queue is not None:
+        _pin_upload(video.id)
+        await asyncio.get_running_loop().run_in_executor(None, job_queue.enqueue, video, media_seconds(video))
+        _imported_revisions.pop(video.id, None)
+        return
+    client = client_key(request)
+    video_processor.jobs.create(video, client, media_seconds(video))
+    scheduler.submit(client, f"process:{video.id}",
+                     lambda: video_processor.process_video(video.id, video.file_path),
+                     cost=media_seconds(video))
+
+async def sync_from_queue(video_id: str):
+    """队列模式下同步 worker 回写的进度、片段和产物路径，共享数据库的查询放到线程中执行"""
+    if job_queue is None:
+        return
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, job_queue.get, video_id)
+    if job is None:
+        return
+    task = Database.get_processing_task(video_id)
+    if task:
+        task.status = job.status if job.status in ("completed", "failed") else "processing"
+        task.progress = job.progress
+        task.message = job.message
+    video = Database.get_video(video_id)
+    if not video or job.revision <= _imported_revisions.get(video_id, 0):
+        return
+    load_transcript(video_id, await loop.run_in_executor(None, job_queue.segments, video_id))
+    _imported_revisions[video_id] = job.revision
+    if job.status not in ("completed", "failed"):
+        return
+    video.transcript_complete = True
+    if job.duration > 0:
+        video.duration = job.duration
+    # worker 的 temp 目录也共享时，直接使用其生成的代理和波形
+    if job.proxy_path and os.path.exists(job.proxy_path):
+        video.proxy_path = job.proxy_path
+    if job.waveform_path and os.path.exists(job.waveform_path):
+        video.waveform_path = job.waveform_path
+    if video.keyframe_index is None:
+        video.keyframe_index = load_keyframes(job.keyframes)
+    asyncio.create_task(video_processor.update_thumbnails(video_id))
+
+# 识别回调的校验令牌
+ASR_CALLBACK_TOKEN = os.getenv("ASR_CALLBACK_TOKEN", "")
+if ASR_CALLBACK_URL and not ASR_CALLBACK_TOKEN:
+    # 没有令牌时任何人都能为任意 TaskId 推送识别结果
+    raise RuntimeError("配置 ASR_CALLBACK_URL 时必须同时设置 ASR_CALLBACK_TOKEN")
+
+# 存储清理周期（秒）
+STORAGE_SWEEP_INTERVAL = int(os.getenv("STORAGE_SWEEP_INTERVAL", 600))
+
+admission = AdmissionController(scheduler, video_processor.asr_clients, video_processor.storage,
+                                STORAGE_SWEEP_INTERVAL, queue_depth=job_queue.depth if job_queue else None)
+
+def _on_artifact_evicted(artifact):
+    """原始上传被淘汰后，该视频已无法导出，删除其记录"""
+    if artifact.kind == "upload":
+        Database.remove_video(artifact.owner)
+
+video_processor.storage.eviction_hooks.append(_on_artifact_evicted)
+
+async def _storage_sweep_loop():
+    """定期执行 TTL 过期与配额淘汰"""
+    while True:
+        await asyncio.sleep(STORAGE_SWEEP_INTERVAL)
+        try:
+            if job_queue is not None:
+                await _refresh_upload_pins()
+            video_processor.storage.enforce()
+        except Exception as e:
+            print(f"存储清理失败: {e}")
+
+def _resume_unfinished_jobs():
+    """重新排队上次运行中未完成的处理任务，处理时从检查点继续"""
+    for record in video_processor.jobs.unfinished():
+        video = video_processor.restore_job(record)
+        if video is None:
+            continue
+        Database.add_processing_task(ProcessingTask(
+            video_id=video.id,
+            status="processing",
+            progress=0,
+            message="服务已重启，正在从检查点恢复处理..."
+        ))
+        scheduler.submit(record.client, f"process:{video.id}",
+                         lambda video=video: video_processor.process_video(video.id, video.file_path, resume=True),
+                         cost=record.cost)
+
+@app.on_event("startup")
+async def startup():
+    """启动时清理崩溃遗留文件、恢复未完成的任务并开始周期清理"""
+    # 先恢复任务，其上传和代理文件登记为刚访问，不会在随后的清理中过期；队列模式下由 worker 接管，
+    # 只需标记其上传文件正在使用，且 temp 目录中的中间文件可能属于正在运行的 worker，不能删除
+    if job_queue is None:
+        _resume_unfinished_jobs()
+    else:
+        await _refresh_upload_pins()
+    video_processor.storage.sweep_orphans(delete_orphans=job_queue is None)
+    asyncio.create_task(_storage_sweep_loop())
 
 @app.get("/")
 async def root():
@@ -56,7 +220,7 @@ async def root():
     return {"message": "Text-Driven Video Editor API", "version": "1.0.0"}
 
 @app.post("/upload", response_model=VideoUploadResponse)
-async def upload_video(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def upload_video(request: Request, file: UploadFile = File(...)):
     """
     上传视频或音频文件
     """
@@ -70,10 +234,17 @@ async def upload_video(background_tasks: BackgroundTasks, file: UploadFile = Fil
     # 保存文件
     file_path = os.path.join(UPLOAD_DIR, f"{video_id}_{file.filename}")
     
+    # 磁盘接近写满时直接拒绝，避免后续处理中途失败
+    try:
+        video_processor.storage.ensure_capacity(file.size or 0)
+    except StorageFullError as e:
+        raise HTTPException(status_code=507, detail=f"存储空间不足，请稍后再试: {str(e)}")
+    
     # 异步保存文件
     with open(file_path, "wb") as buffer:
         content = await file.read()
         buffer.write(content)
+    video_processor.storage.register(file_path, video_id, "upload")
     
     # 创建视频对象
     video = Video(
@@ -87,6 +258,14 @@ async def upload_video(background_tasks: BackgroundTasks, file: UploadFile = Fil
     # 保存到数据库
     Database.add_video(video)
     
+    # 上传时即探测媒体信息，时长用于调度排序，处理时不再重复探测
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            None, video_processor.get_media_info, video_id, file_path
+        )
+    except Exception as e:
+        print(f"上传时探测媒体信息失败，按文件大小估计时长: {e}")
+    
     # 根据文件类型设置不同的处理消息
     if file.content_type.startswith('audio/'):
         message = "音频文件上传完成，开始语音识别..."
@@ -102,8 +281,8 @@ async def upload_video(background_tasks: BackgroundTasks, file: UploadFile = Fil
     )
     Database.add_processing_task(task)
     
-    # 后台处理视频/音频
-    background_tasks.add_task(video_processor.process_video, video_id, file_path)
+    # 排队处理视频/音频
+    await submit_processing(request, video)
     
     return VideoUploadResponse(
         video_id=video_id,
@@ -112,32 +291,93 @@ async def upload_video(background_tasks: BackgroundTasks, file: UploadFile = Fil
         upload_time=video.upload_time
     )
 
+@app.get("/videos/{video_id}", response_model=VideoInfo)
+async def get_video_info(video_id: str):
+    """
+    获取视频详情与媒体信息
+    """
+    await sync_from_queue(video_id)
+    video = Database.get_video(video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="视频未找到")
+    
+    return VideoInfo(
+        video_id=video.id,
+        filename=video.filename,
+        size=video.size,
+        upload_time=video.upload_time,
+        duration=video.duration,
+        media_info=MediaInfo(**video.media_info.to_dict()) if video.media_info else None,
+        has_proxy=bool(video.proxy_path),
+        has_waveform=bool(video.waveform_path),
+        transcript_complete=video.transcript_complete
+    )
+
 @app.get("/videos/{video_id}/transcript", response_model=List[TranscriptSegment])
-async def get_transcript(video_id: str):
+async def get_transcript(video_id: str, response: Response):
     """
     获取视频转录文本
+
+    识别进行中时返回已生成的部分片段，X-Transcript-Complete 标记转录是否已全部生成
     """
+    await sync_from_queue(video_id)
     video = Database.get_video(video_id)
     if not video:
         raise HTTPException(status_code=404, detail="视频未找到")
     
     segments = Database.get_transcript(video_id)
+    response.headers["X-Transcript-Complete"] = "true" if video.transcript_complete else "false"
+    response.headers["Access-Control-Expose-Headers"] = "X-Transcript-Complete"
     return segments
 
+@app.get("/search", response_model=SearchResponse)
+async def search_transcripts(q: str, video_id: str = None, limit: int = 20):
+    """
+    在所有转录片段中全文检索，按相关度排序，可用 video_id 限定在一个视频内
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="检索词不能为空")
+    
+    total, hits = Database.search_index.search(q, video_id=video_id, limit=max(1, min(limit, 200)))
+    return SearchResponse(
+        query=q,
+        total=total,
+        hits=[
+            SearchHit(
+                video_id=segment.video_id,
+                segment_id=segment.id,
+                text=segment.text,
+                start_time=segment.start_time,
+                end_time=segment.end_time,
+                score=round(score, 4)
+            )
+            for score, segment in hits
+        ]
+    )
+
 @app.get("/videos/{video_id}/status", response_model=ProcessingStatus)
 async def get_processing_status(video_id: str):
     """
     获取视频处理状态
     """
+    await sync_from_queue(video_id)
     task = Database.get_processing_task(video_id)
     if not task:
         raise HTTPException(status_code=404, detail="处理任务未找到")
     
+    message = task.message
+    if job_queue is not None:
+        position = await asyncio.get_running_loop().run_in_executor(None, job_queue.position, video_id)
+    else:
+        position = scheduler.position(f"process:{video_id}")
+    if position is not None:
+        message = f"排队等待处理，前面还有 {position} 个任务"
+    
     return ProcessingStatus(
         video_id=task.video_id,
         status=task.status,
         progress=task.progress,
-        message=task.message
+        message=message
     )
 
 @app.put("/segments/{segment_id}")
@@ -179,7 +419,7 @@ async def reorder_segments(video_id: str, reorder: ReorderRequest):
     }
 
 @app.post("/segments/{segment_id}/split")
-async def split_segment(segment_id: str, split_request: dict):
+async def split_segment(segment_id: str, split_request: dict, background_tasks: BackgroundTasks):
     """
     分割视频片段
     """
@@ -242,6 +482,9 @@ async def split_segment(segment_id: str, split_request: dict):
         segments.sort(key=lambda x: x.order)
         Database.add_transcript(video_id, segments)
         
+        # 后台为新片段补齐缩略图
+        background_tasks.add_task(video_processor.update_thumbnails, video_id)
+        
         print(f"分割成功，生成了 {len(new_segments)} 个新片段")
         
         return {
@@ -257,7 +500,7 @@ async def split_segment(segment_id: str, split_request: dict):
         raise HTTPException(status_code=400, detail=f"分割失败: {str(e)}")
 
 @app.post("/videos/{video_id}/export", response_model=ExportResponse)
-async def export_video(video_id: str, export_request: ExportRequest):
+async def export_video(video_id: str, export_request: ExportRequest, request: Request):
     """
     导出视频
     """
@@ -265,14 +508,26 @@ async def export_video(video_id: str, export_request: ExportRequest):
     if not video:
         raise HTTPException(status_code=404, detail="视频未找到")
     
+    # 导出成本为所选片段的总时长，短导出走交互通道
+    selected = set(export_request.segment_order)
+    export_seconds = sum(
+        s.end_time - s.start_time for s in Database.get_transcript(video_id) if s.id in selected
+    )
+    
     try:
-        output_path = await video_processor.export_video(
-            video_id, 
-            export_request.segment_order, 
-            export_request.mode,
-            export_request.format,
-            export_request.quality,
-            export_request.resolution
+        # 导出同样经过调度器排队，与处理任务共享并发额度
+        output_path = await scheduler.submit(
+            client_key(request), f"export:{video_id}:{uuid.uuid4().hex[:8]}",
+            lambda: video_processor.export_video(
+                video_id, 
+                export_request.segment_order, 
+                export_request.mode,
+                export_request.format,
+                export_request.quality,
+                export_request.resolution,
+                export_request.workers
+            ),
+            cost=export_seconds
         )
         
         # 获取文件大小
@@ -283,24 +538,189 @@ async def export_video(video_id: str, export_request: ExportRequest):
             filename=os.path.basename(output_path),
             size=file_size
         )
+    except StorageFullError as e:
+        raise HTTPException(status_code=507, detail=f"存储空间不足，请稍后再试: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"导出失败: {str(e)}")
 
-@app.get("/download/{filename}")
-async def download_file(filename: str):
+@app.api_route("/download/{filename}", methods=["GET", "HEAD"])
+async def download_file(filename: str, request: Request):
     """
-    下载文件
+    下载文件（支持断点续传、播放器拖动和并行分段下载）
     """
-    file_path = os.path.join("temp", filename)
-    if not os.path.exists(file_path):
+    # 只允许访问 temp 目录下的文件
+    if os.path.basename(filename) != filename:
+        raise HTTPException(status_code=400, detail="无效的文件名")
+    
+    file_path = os.path.join(video_processor.temp_dir, filename)
+    if not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="文件未找到")
     
-    return FileResponse(
-        path=file_path,
-        filename=filename,
-        media_type='application/octet-stream'
+    video_processor.storage.touch(file_path)
+    return RangeFileResponse(request, file_path, filename=filename)
+
+@app.api_route("/videos/{video_id}/proxy", methods=["GET", "HEAD"])
+async def get_proxy(video_id: str, request: Request):
+    """
+    获取低码率代理文件，供编辑器快速播放和拖动（导出仍使用原始文件）
+    """
+    video = Database.get_video(video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="视频未找到")
+    
+    if not video.proxy_path or not os.path.isfile(video.proxy_path):
+        raise HTTPException(status_code=404, detail="代理文件尚未生成")
+    
+    video_processor.storage.touch(video.proxy_path)
+    return RangeFileResponse(request, video.proxy_path)
+
+@app.get("/videos/{video_id}/waveform")
+async def get_waveform(video_id: str, start: float = 0.0, end: float = None, pixels: int = 1000):
+    """
+    获取时间窗口内的波形峰值
+    
+    返回 int8 [min, max] 交错的二进制数据，每对对应一个像素，
+    响应头给出每个峰值覆盖的采样数和采样率
+    """
+    video = Database.get_video(video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="视频未找到")
+    
+    if not video.waveform_path or not os.path.isfile(video.waveform_path):
+        raise HTTPException(status_code=404, detail="波形数据尚未生成")
+    
+    if pixels <= 0 or pixels > 20000:
+        raise HTTPException(status_code=400, detail="pixels 必须在 1 到 20000 之间")
+    
+    video_processor.storage.touch(video.waveform_path)
+    pyramid = PeakPyramid(video.waveform_path)
+    if end is None:
+        end = pyramid.duration
+    samples_per_peak, peaks = pyramid.window(start, end, pixels)
+    
+    return Response(
+        content=peaks.tobytes(),
+        media_type="application/octet-stream",
+        headers={
+            "X-Sample-Rate": str(pyramid.sample_rate),
+            "X-Samples-Per-Peak": str(samples_per_peak),
+            "X-Peak-Count": str(len(peaks)),
+            "X-Duration": f"{pyramid.duration:.3f}",
+            "Access-Control-Expose-Headers": "X-Sample-Rate, X-Samples-Per-Peak, X-Peak-Count, X-Duration",
+        }
     )
 
+@app.get("/videos/{video_id}/keyframes")
+async def get_keyframes(video_id: str, t: float):
+    """
+    查询时间点 t 前后最近的关键帧，用于拖动定位和剪切点吸附
+    """
+    video = Database.get_video(video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="视频未找到")
+    
+    if not video.keyframe_index:
+        raise HTTPException(status_code=404, detail="关键帧索引尚未生成")
+    
+    return {
+        "t": t,
+        "before": video.keyframe_index.nearest_before(t),
+        "after": video.keyframe_index.nearest_after(t),
+        "nearest": video.keyframe_index.snap(t),
+        "keyframe_count": len(video.keyframe_index)
+    }
+
+@app.get("/videos/{video_id}/text-position")
+async def get_text_position(video_id: str, t: float):
+    """
+    查询时间 t 对应的片段和文本位置，供播放时高亮当前文字
+
+    片段有词级时间戳时返回精确的字符偏移，否则按时间比例估算
+    """
+    video = Database.get_video(video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="视频未找到")
+    
+    for segment in Database.get_transcript(video_id):
+        if segment.start_time <= t < segment.end_time:
+            word_timing = Database.get_word_timing(video_id, segment.id)
+            if word_timing:
+                char_offset = word_timing.char_at_time(t)
+            else:
+                ratio = (t - segment.start_time) / (segment.end_time - segment.start_time)
+                char_offset = int(len(segment.text) * ratio)
+            return {
+                "segment_id": segment.id,
+                "char_offset": char_offset,
+                "exact": word_timing is not None
+            }
+    
+    raise HTTPException(status_code=404, detail="该时间点没有对应的片段")
+
+@app.get("/videos/{video_id}/thumbnails")
+async def get_thumbnails(video_id: str):
+    """
+    获取片段缩略图索引：每个片段对应的雪碧图及其在图中的位置
+    """
+    video = Database.get_video(video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="视频未找到")
+    
+    index = video_processor.thumbnail_sprites(video_id).load_index()
+    if not index:
+        raise HTTPException(status_code=404, detail="缩略图尚未生成")
+    
+    return {
+        "tile_width": index["tile_width"],
+        "tile_height": index["tile_height"],
+        "sheets": [f"/videos/{video_id}/thumbnails/{name}" for name in index["sheets"]],
+        "segments": {
+            seg_id: index["frames"][key]
+            for seg_id, key in index["segments"].items()
+        }
+    }
+
+@app.get("/videos/{video_id}/thumbnails/{sheet}")
+async def get_thumbnail_sheet(video_id: str, sheet: str, request: Request):
+    """
+    获取缩略图雪碧图
+    """
+    if os.path.basename(sheet) != sheet or not sheet.startswith("sheet_"):
+        raise HTTPException(status_code=400, detail="无效的文件名")
+    
+    sprites = video_processor.thumbnail_sprites(video_id)
+    sheet_path = os.path.join(sprites.cache_dir, sheet)
+    if not os.path.isfile(sheet_path):
+        raise HTTPException(status_code=404, detail="文件未找到")
+    
+    video_processor.storage.touch(sprites.cache_dir)
+    return RangeFileResponse(request, sheet_path)
+
+@app.post("/asr/callback")
+async def asr_callback(request: Request):
+    """
+    腾讯云录音文件识别完成回调（也可由本地替身服务调用）
+
+    回调地址需携带与 ASR_CALLBACK_TOKEN 相同的 token 查询参数；未设置令牌时拒绝所有回调
+    """
+    token = request.query_params.get("token") or ""
+    if not ASR_CALLBACK_TOKEN or not hmac.compare_digest(token.encode(), ASR_CALLBACK_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="回调令牌无效")
+    
+    form = await request.form()
+    try:
+        completion = parse_callback(dict(form))
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="回调参数无效")
+    
+    if job_queue is not None:
+        # 等待结果的是 worker 进程，经由共享队列数据库转交
+        await asyncio.get_running_loop().run_in_executor(None, job_queue.put_completion, completion)
+    else:
+        video_processor.asr_callbacks.complete(completion)
+    # 腾讯云要求以 code 0 确认收到回调
+    return {"code": 0, "message": "成功"}
+
 @app.get("/debug/videos/{video_id}/segments")
 async def debug_segments(video_id: str):
     """
@@ -329,8 +749,56 @@ async def debug_segments(video_id: str):
         ]
     }
 
+@app.post("/videos/{video_id}/retranscribe", response_model=RetranscribeResponse)
+async def retranscribe_range(video_id: str, retranscribe_request: RetranscribeRequest, request: Request,
+                             background_tasks: BackgroundTasks):
+    """
+    局部重新识别：只识别指定片段或时间范围，替换该范围内的片段，其余片段的编辑保留
+    """
+    video = Database.get_video(video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="视频未找到")
+    
+    task = Database.get_processing_task(video_id)
+    if task and task.status == "processing":
+        raise HTTPException(status_code=409, detail="视频仍在处理中")
+    
+    # 调度成本为重新识别的时间范围，未指定范围时按整个视频计
+    if retranscribe_request.segment_ids:
+        selected = set(retranscribe_request.segment_ids)
+        span = sum(s.end_time - s.start_time for s in Database.get_transcript(video_id) if s.id in selected)
+    else:
+        start = retranscribe_request.start_time or 0.0
+        end = retranscribe_request.end_time if retranscribe_request.end_time is not None else media_seconds(video)
+        span = max(end - start, 0.0)
+    
+    try:
+        removed_ids, new_segments = await scheduler.submit(
+            client_key(request), f"retranscribe:{video_id}:{uuid.uuid4().hex[:8]}",
+            lambda: video_processor.retranscribe_range(
+                video_id, retranscribe_request.start_time, retranscribe_request.end_time,
+                retranscribe_request.segment_ids
+            ),
+            cost=span
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except StorageFullError as e:
+        raise HTTPException(status_code=507, detail=f"存储空间不足，请稍后再试: {str(e)}")
+    except Exception as e:
+        print(f"局部重新识别失败: {e}")
+        raise HTTPException(status_code=500, detail=f"局部重新识别失败: {str(e)}")
+    
+    # 后台为新片段补齐缩略图
+    background_tasks.add_task(video_processor.update_thumbnails, video_id)
+    
+    return RetranscribeResponse(
+        removed_segment_ids=removed_ids,
+        new_segments=[s.__dict__ for s in new_segments]
+    )
+
 @app.post("/videos/{video_id}/reprocess")
-async def reprocess_video(video_id: str, background_tasks: BackgroundTasks):
+async def reprocess_video(video_id: str, request: Request):
     """
     重新处理视频（用于修复时间戳问题）
     """
@@ -339,8 +807,7 @@ async def reprocess_video(video_id: str, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=404, detail="视频未找到")
     
     # 清理旧的转录数据
-    if video_id in Database.transcripts:
-        del Database.transcripts[video_id]
+    Database.add_transcript(video_id, [])
     
     # 创建新的处理任务
     task = ProcessingTask(
@@ -351,8 +818,9 @@ async def reprocess_video(video_id: str, background_tasks: BackgroundTasks):
     )
     Database.add_processing_task(task)
     
-    # 后台重新处理视频
-    background_tasks.add_task(video_processor.process_video, video_id, video.file_path)
+    # 排队重新处理视频
+    video.transcript_complete = False
+    await submit_processing(request, video)
     
     return {"message": "视频重新处理已开始", "video_id": video_id}
 
@@ -0,0 +1,111 @@
+"""
+媒体探测 - 每次上传只运行一次 ffprobe，解析并缓存格式、流、时长、编码、分辨率和帧率
+"""
+
+import wave
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+import ffmpeg
+
+# 语音识别所需的音频格式: 16kHz 单声道 16bit PCM
+ASR_SAMPLE_RATE = 16000
+ASR_CHANNELS = 1
+ASR_SAMPLE_WIDTH = 2
+
+def is_asr_ready_wav(path: str) -> bool:
+    """
+    只读取 WAV 文件头，判断是否已是识别所需格式（16kHz 单声道 pcm_s16le）
+
+    wave 模块只接受 PCM 编码的 RIFF/WAVE 文件，其他格式直接返回 False
+    """
+    try:
+        with wave.open(path, "rb") as wav:
+            return (
+                wav.getcomptype() == "NONE"
+                and wav.getframerate() == ASR_SAMPLE_RATE
+                and wav.getnchannels() == ASR_CHANNELS
+                and wav.getsampwidth() == ASR_SAMPLE_WIDTH
+                and wav.getnframes() > 0
+            )
+    except (wave.Error, EOFError, OSError):
+        return False
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """解析 "30000/1001" 形式的帧率"""
+    if not rate:
+        return 0.0
+    num, _, den = rate.partition("/")
+    try:
+        num_value = float(num)
+        den_value = float(den) if den else 1.0
+        return num_value / den_value if den_value else 0.0
+    except ValueError:
+        return 0.0
+
+@dataclass
+class MediaInfo:
+    """探测得到的媒体信息"""
+    format_name: str = ""
+    duration: float = 0.0
+    size: int = 0
+    bit_rate: int = 0
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    width: int = 0
+    height: int = 0
+    frame_rate: float = 0.0
+    sample_rate: int = 0
+    channels: int = 0
+    sample_fmt: Optional[str] = None
+    streams: List[Dict] = field(default_factory=list)
+
+    @property
+    def has_video(self) -> bool:
+        return self.video_codec is not None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+def probe_media(path: str) -> MediaInfo:
+    """运行 ffprobe 并解析结果"""
+    probe = ffmpeg.probe(path)
+    fmt = probe.get("format", {})
+
+    info = MediaInfo(
+        format_name=fmt.get("format_name", ""),
+        duration=float(fmt.get("duration") or 0.0),
+        size=int(fmt.get("size") or 0),
+        bit_rate=int(fmt.get("bit_rate") or 0),
+    )
+
+    for stream in probe.get("streams", []):
+        codec_type = stream.get("codec_type")
+        info.streams.append({
+            "index": stream.get("index"),
+            "codec_type": codec_type,
+            "codec_name": stream.get("codec_name"),
+            "duration": float(stream.get("duration") or 0.0),
+        })
+
+        # 音频文件的封面图也是视频流，不计入
+        if codec_type == "video" and info.video_codec is None \
+                and not stream.get("disposition", {}).get("attached_pic"):
+            info.video_codec = stream.get("codec_name")
+            info.width = int(stream.get("width") or 0)
+            info.height = int(stream.get("height") or 0)
+            info.frame_rate = _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate"))
+        elif codec_type == "audio" and info.audio_codec is None:
+            info.audio_codec = stream.get("codec_name")
+            info.sample_rate = int(stream.get("sample_rate") or 0)
+            info.channels = int(stream.get("channels") or 0)
+            info.sample_fmt = stream.get("sample_fmt")
+
+    # 部分容器的 format 不带时长，使用最长的流时长
+    if info.duration <= 0 and info.streams:
+        info.duration = max(s["duration"] for s in info.streams)
+
+    return info
@@ -6,6 +6,10 @@ import uuid
 from typing import List, Dict, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
+from keyframe_index import KeyframeIndex
+from media_probe import MediaInfo
+from word_timing import WordTimingIndex
+from search_index import SearchIndex
 
 @dataclass
 class Video:
@@ -16,6 +20,11 @@ class Video:
     size: int
     upload_time: datetime
     duration: float = 0.0
+    proxy_path: Optional[str] = None  # 低码率代理文件，用于前端快速播放和拖动
+    waveform_path: Optional[str] = None  # 波形峰值金字塔文件
+    keyframe_index: Optional[KeyframeIndex] = None  # 上传时探测的关键帧时间戳
+    media_info: Optional[MediaInfo] = None  # 上传时探测的格式、流和编码信息
+    transcript_complete: bool = False  # 转录是否已全部生成（识别期间片段逐块追加）
 
 @dataclass
 class TranscriptSegment:
@@ -42,6 +51,10 @@ class Database:
     videos: Dict[str, Video] = {}
     transcripts: Dict[str, List[TranscriptSegment]] = {}
     processing_tasks: Dict[str, ProcessingTask] = {}
+    # 片段的词级时间索引: video_id -> {segment_id: WordTimingIndex}
+    word_timings: Dict[str, Dict[str, WordTimingIndex]] = {}
+    # 所有片段文本的全文索引，随转录写入增量更新
+    search_index = SearchIndex()
 
     @classmethod
     def add_video(cls, video: Video):
@@ -51,9 +64,85 @@ class Database:
     def get_video(cls, video_id: str) -> Optional[Video]:
         return cls.videos.get(video_id)
 
+    @classmethod
+    def remove_video(cls, video_id: str):
+        """删除视频及其转录和处理任务"""
+        cls.videos.pop(video_id, None)
+        cls.transcripts.pop(video_id, None)
+        cls.processing_tasks.pop(video_id, None)
+        cls.word_timings.pop(video_id, None)
+        cls.search_index.remove_video(video_id)
+
     @classmethod
     def add_transcript(cls, video_id: str, segments: List[TranscriptSegment]):
         cls.transcripts[video_id] = segments
+        cls._prune_word_timings(video_id)
+        cls.search_index.sync_video(video_id, segments)
+
+    @classmethod
+    def append_segments(cls, video_id: str, segments: List[TranscriptSegment]):
+        """追加片段，order 接在现有片段之后"""
+        transcript = cls.transcripts.setdefault(video_id, [])
+        next_order = max((seg.order for seg in transcript), default=-1) + 1
+        for i, segment in enumerate(segments):
+            segment.order = next_order + i
+        transcript.extend(segments)
+        for segment in segments:
+            cls.search_index.add(segment)
+
+    @classmethod
+    def next_segment_index(cls, video_id: str) -> int:
+        """下一个未使用的片段序号（片段ID格式 seg_videoId_序号[_子序号]）"""
+        prefix = f"seg_{video_id}_"
+        next_index = 0
+        for segment in cls.transcripts.get(video_id, []):
+            if segment.id.startswith(prefix):
+                index = segment.id[len(prefix):].split("_")[0]
+                if index.isdigit():
+                    next_index = max(next_index, int(index) + 1)
+        return next_index
+
+    @classmethod
+    def replace_segments(cls, video_id: str, segment_ids: List[str],
+                         new_segments: List[TranscriptSegment]) -> List[TranscriptSegment]:
+        """
+        用新片段替换指定片段，新片段插入到被替换片段中最靠前的位置，
+        其余片段保持原有顺序和内容，order 重新连续编号
+        """
+        removed = set(segment_ids)
+        transcript = sorted(cls.transcripts.get(video_id, []), key=lambda seg: seg.order)
+        insert_at = next((i for i, seg in enumerate(transcript) if seg.id in removed), len(transcript))
+        kept_before = [seg for seg in transcript[:insert_at] if seg.id not in removed]
+        kept_after = [seg for seg in transcript[insert_at:] if seg.id not in removed]
+
+        updated = kept_before + new_segments + kept_after
+        for i, segment in enumerate(updated):
+            segment.order = i
+        cls.transcripts[video_id] = updated
+        cls._prune_word_timings(video_id)
+        cls.search_index.sync_video(video_id, updated)
+        return updated
+
+    @classmethod
+    def set_word_timing(cls, video_id: str, segment_id: str, index: Optional[WordTimingIndex]):
+        """index 为 None 时删除旧索引（分割可能复用片段ID）"""
+        if index is not None:
+            cls.word_timings.setdefault(video_id, {})[segment_id] = index
+        else:
+            cls.word_timings.get(video_id, {}).pop(segment_id, None)
+
+    @classmethod
+    def get_word_timing(cls, video_id: str, segment_id: str) -> Optional[WordTimingIndex]:
+        return cls.word_timings.get(video_id, {}).get(segment_id)
+
+    @classmethod
+    def _prune_word_timings(cls, video_id: str):
+        """删除已不在转录中的片段的词级时间"""
+        timings = cls.word_timings.get(video_id)
+        if timings:
+            current = {seg.id for seg in cls.transcripts.get(video_id, [])}
+            for segment_id in [sid for sid in timings if sid not in current]:
+                del timings[segment_id]
 
     @classmethod
     def get_transcript(cls, video_id: str) -> List[TranscriptSegment]:
@@ -82,6 +171,10 @@ class Database:
                 if segment.id == segment_id:
                     old_text = segment.text
                     segment.text = cleaned_text
+                    if cleaned_text != old_text:
+                        # 词级时间是按原识别文本的字符偏移建立的，文本改动后不再适用
+                        cls.word_timings.get(video_id, {}).pop(segment_id, None)
+                    cls.search_index.add(segment)
                     print(f"片段更新成功: {segment_id}")
                     print(f"旧文本: {old_text[:50]}...")
                     print(f"新文本: {cleaned_text[:50]}...")
@@ -103,6 +196,7 @@ class Database:
                 segment_map[seg_id].order = i
                 reordered.append(segment_map[seg_id])
         cls.transcripts[video_id] = reordered
+        cls.search_index.sync_video(video_id, reordered)
         return reordered
 
     @classmethod
@@ -0,0 +1,205 @@
+"""
+分块并行导出 - 将合并导出的有序时间线切分为若干连续区间，
+在多个工作进程中以相同的编码参数并行编码，最后无损拼接
+"""
+
+import os
+import uuid
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+import ffmpeg
+
+# 每个并行区间的最短时长（秒），过短的区间拆分收益低于进程启动开销
+MIN_SPAN_SECONDS = 30.0
+# 单次导出最多同时运行的编码进程数，每个进程都会完整打开源视频
+EXPORT_MAX_WORKERS = int(os.getenv("EXPORT_MAX_WORKERS", 4))
+
+def plan_spans(ranges: List[Tuple[float, float]], workers: int,
+               min_span: float = MIN_SPAN_SECONDS,
+               snap: Optional[Callable[[float], float]] = None) -> List[List[Tuple[float, float]]]:
+    """
+    将有序时间线（源视频时间范围列表）按总时长均分为最多 workers 个连续区间
+
+    每个区间仍是一组源时间范围，跨越区间边界的片段会被切开；
+    提供 snap 时切点吸附到源视频关键帧，各工作进程从关键帧开始解码
+    """
+    ranges = [(start, end) for start, end in ranges if end > start]
+    total = sum(end - start for start, end in ranges)
+
+    span_count = max(1, min(workers, int(total // min_span)))
+    if span_count == 1:
+        return [ranges] if ranges else []
+
+    target = total / span_count
+    spans = []
+    current = []
+    filled = 0.0
+
+    for start, end in ranges:
+        while end > start:
+            remaining = target - filled
+            length = end - start
+
+            # 最后一个区间吸收所有剩余时长，避免浮点误差产生碎片
+            if length <= remaining or len(spans) == span_count - 1:
+                current.append((start, end))
+                filled += length
+                break
+
+            cut = start + max(remaining, 0.0)
+            if snap is not None:
+                snapped = snap(cut)
+                if start < snapped < end:
+                    cut = snapped
+            if cut > start:
+                current.append((start, cut))
+            if current:
+                spans.append(current)
+            current = []
+            # 吸附后区间长度与目标略有偏差，计入下一个区间
+            filled = (cut - start) - remaining
+            start = cut
+
+    if current:
+        spans.append(current)
+
+    return spans
+
+def _parse_resolution(resolution: str):
+    """将 "1280x720" 形式的分辨率转换为 (宽, 高)"""
+    width, height = resolution.lower().split("x")
+    return int(width), int(height)
+
+def resize_for_export(clip, quality_settings: dict):
+    """按质量设置缩放剪辑：固定分辨率或按高度等比缩放"""
+    if quality_settings.get("resolution"):
+        return clip.resize(_parse_resolution(quality_settings["resolution"]))
+    if quality_settings.get("height"):
+        # 与代理的 scale=-2:高度 一致：宽度取偶数，libx264 的 yuv420p 不接受奇数宽高
+        height = quality_settings["height"] // 2 * 2
+        width = max(2, round(clip.w * height / clip.h / 2) * 2)
+        return clip.resize((width, height))
+    return clip
+
+def encoder_options(quality_settings: dict) -> dict:
+    """质量设置对应的 write_videofile 编码参数"""
+    options = {
+        "codec": quality_settings["codec"],
+        "bitrate": quality_settings["bitrate"],
+        "audio_codec": quality_settings["audio_codec"],
+        "preset": quality_settings.get("preset", "medium"),
+    }
+    if quality_settings.get("fps"):
+        options["fps"] = quality_settings["fps"]
+    if quality_settings.get("audio_bitrate"):
+        options["audio_bitrate"] = quality_settings["audio_bitrate"]
+    return options
+
+def encode_span(video_path: str, ranges: List[Tuple[float, float]], output_path: str,
+                quality_settings: dict, fps: float) -> str:
+    """
+    在工作进程中编码一个区间
+
+    所有区间使用相同的编码器、码率、帧率和音频参数，保证可以无损拼接
+    """
+    from moviepy.editor import VideoFileClip, concatenate_videoclips
+
+    video = VideoFileClip(video_path)
+    clips = []
+    final_clip = None
+    try:
+        clips = [video.subclip(start, end) for start, end in ranges]
+        final_clip = concatenate_videoclips(clips) if len(clips) > 1 else clips[0]
+
+        final_clip = resize_for_export(final_clip, quality_settings)
+
+        options = encoder_options(quality_settings)
+        options["fps"] = fps
+        final_clip.write_videofile(
+            output_path,
+            audio_fps=44100,
+            **options,
+            threads=1,
+            verbose=False,
+            logger=None
+        )
+        return output_path
+    finally:
+        if final_clip is not None:
+            final_clip.close()
+        for clip in clips:
+            clip.close()
+        video.close()
+
+def concat_lossless(part_paths: List[str], output_path: str, temp_dir: str):
+    """使用 ffmpeg concat 分离器按流复制拼接各区间，不重新编码"""
+    list_path = os.path.join(temp_dir, f"concat_{uuid.uuid4()}.txt")
+    try:
+        with open(list_path, "w", encoding="utf-8") as f:
+            for part_path in part_paths:
+                escaped = os.path.abspath(part_path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        (
+            ffmpeg
+            .input(list_path, format="concat", safe=0)
+            .output(output_path, c="copy")
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True, quiet=True)
+        )
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+async def export_parallel(video_path: str, ranges: List[Tuple[float, float]], output_path: str,
+                          quality_settings: dict, format: str, workers: int, temp_dir: str,
+                          snap: Optional[Callable[[float], float]] = None,
+                          source_fps: float = 0.0) -> bool:
+    """
+    并行编码并拼接合并导出
+
+    source_fps 为上传时探测的源帧率，未提供时重新探测。
+    返回 False 表示时间线太短不值得拆分，调用方应使用单进程导出
+    """
+    # 进程数不超过请求值、CPU 核数和配置上限
+    workers = max(1, min(workers, os.cpu_count() or 1, EXPORT_MAX_WORKERS))
+    spans = plan_spans(ranges, workers, snap=snap)
+    if len(spans) <= 1:
+        return False
+
+    # 所有区间必须使用同一帧率，否则拼接后时间戳不连续
+    fps = quality_settings.get("fps") or source_fps
+    if not fps:
+        probe = ffmpeg.probe(video_path)
+        video_stream = next((s for s in probe["streams"] if s.get("codec_type") == "video"), None)
+        if video_stream is None:
+            raise ValueError("源文件没有视频流，无法并行导出")
+        num, _, den = video_stream.get("avg_frame_rate", "25/1").partition("/")
+        fps = float(num) / float(den or 1) if float(num or 0) > 0 else 25.0
+
+    print(f"分块并行导出: {len(spans)} 个区间，帧率 {fps:.3f}")
+
+    part_paths = [
+        os.path.join(temp_dir, f"part_{uuid.uuid4()}_{i:03d}.{format}")
+        for i in range(len(spans))
+    ]
+
+    loop = asyncio.get_running_loop()
+    try:
+        with ProcessPoolExecutor(max_workers=min(len(spans), workers)) as executor:
+            await asyncio.gather(*[
+                loop.run_in_executor(executor, encode_span, video_path, span, part_path, quality_settings, fps)
+                for span, part_path in zip(spans, part_paths)
+            ])
+
+        await loop.run_in_executor(None, concat_lossless, part_paths, output_path, temp_dir)
+    finally:
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                try:
+                    os.remove(part_path)
+                except OSError:
+                    pass
+
+    return True
@@ -0,0 +1,256 @@
+"""
+任务调度 - 按客户端分队列的公平调度，处理和导出任务经由调度器执行
+
+每个客户端（已配置的 API Key，否则为来源 IP）一个队列，客户端之间加权轮询，
+并限制每个客户端同时运行的任务数，批量上传的客户端不会阻塞其他用户
+
+任务按媒体时长估计成本：短任务走交互通道，长任务走批量通道，两个通道各有并发额度；
+同一队列内短任务优先，等待时间按 SCHEDULER_AGING_RATE 抵消成本，长任务不会饿死
+"""
+
+import os
+import hmac
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+# 全局同时运行的任务数
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", 2))
+# 每个客户端同时运行的任务数
+SCHEDULER_CLIENT_CONCURRENCY = int(os.getenv("SCHEDULER_CLIENT_CONCURRENCY", 1))
+# 交互通道（短任务）同时运行的任务数，与批量通道互不占用
+SCHEDULER_INTERACTIVE_CONCURRENCY = int(os.getenv("SCHEDULER_INTERACTIVE_CONCURRENCY", 1))
+# 媒体时长不超过该秒数的任务走交互通道
+SCHEDULER_INTERACTIVE_MAX_SECONDS = float(os.getenv("SCHEDULER_INTERACTIVE_MAX_SECONDS", 300))
+# 每等待1秒抵消的成本秒数：为10时，2小时的任务等待12分钟后优先于新到的短任务
+SCHEDULER_AGING_RATE = float(os.getenv("SCHEDULER_AGING_RATE", 10))
+# 尚无完成任务时假定的单个任务运行秒数，用于估计排队等待时间
+DEFAULT_JOB_SECONDS = 60.0
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+def _parse_weights(value: str) -> Dict[str, int]:
+    """解析 "key1:3,key2:2" 形式的客户端权重"""
+    weights = {}
+    for item in value.split(","):
+        client, _, weight = item.strip().rpartition(":")
+        if client and weight.isdigit():
+            weights[client] = max(1, int(weight))
+    return weights
+
+# 客户端权重，未配置的客户端权重为 1
+SCHEDULER_CLIENT_WEIGHTS = _parse_weights(os.getenv("SCHEDULER_CLIENT_WEIGHTS", ""))
+
+def _parse_api_keys(value: str) -> Dict[str, str]:
+    """解析 "名称:密钥,..." 形式的 API Key 配置，返回 密钥 -> 名称"""
+    keys = {}
+    for item in value.split(","):
+        name, _, secret = item.strip().partition(":")
+        if name and secret:
+            keys[secret] = name
+    return keys
+
+# 已知的 API Key，只有配置过的密钥才作为客户端标识，客户端以名称区分（权重也按名称配置）
+SCHEDULER_API_KEYS = _parse_api_keys(os.getenv("SCHEDULER_API_KEYS", ""))
+# 服务前面的可信反向代理层数（Render 为 1），据此从 X-Forwarded-For 取真实来源 IP
+SCHEDULER_PROXY_HOPS = int(os.getenv("SCHEDULER_PROXY_HOPS", 0))
+
+def _remote_address(request) -> str:
+    """来源 IP：X-Forwarded-For 中由可信代理追加的那一项，客户端自己伪造的前缀项被忽略"""
+    if SCHEDULER_PROXY_HOPS > 0:
+        forwarded = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+        if len(forwarded) >= SCHEDULER_PROXY_HOPS:
+            return forwarded[-SCHEDULER_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+def client_key(request) -> str:
+    """
+    识别请求所属的客户端：已配置的 API Key 按其名称，否则按来源 IP
+
+    Origin 对同一前端的所有用户都相同，未配置的 X-Api-Key 可以随意伪造，都不作为标识
+    """
+    api_key = request.headers.get("x-api-key")
+    if api_key:
+        for secret, name in SCHEDULER_API_KEYS.items():
+            if hmac.compare_digest(api_key.encode(), secret.encode()):
+                return f"key:{name}"
+    return f"ip:{_remote_address(request)}"
+
+@dataclass
+class Job:
+    """排队中的任务"""
+    client: str
+    name: str
+    run: Callable[[], Awaitable]
+    cost: float = 0.0  # 估计成本，即需要处理的媒体秒数
+    submitted: float = field(default_factory=time.monotonic)
+    future: asyncio.Future = field(default=None)
+
+    def priority(self, now: float, aging_rate: float) -> float:
+        """越小越先执行：成本减去等待时间带来的补偿"""
+        return self.cost - aging_rate * (now - self.submitted)
+
+class FairScheduler:
+    """按客户端加权轮询的任务调度器，所有方法都在事件循环中调用"""
+
+    def __init__(self, max_concurrency: int = SCHEDULER_MAX_CONCURRENCY,
+                 client_concurrency: int = SCHEDULER_CLIENT_CONCURRENCY,
+                 weights: Optional[Dict[str, int]] = None,
+                 aging_rate: float = SCHEDULER_AGING_RATE, name: str = BULK):
+        self.max_concurrency = max_concurrency
+        self.client_concurrency = client_concurrency
+        self.weights = weights if weights is not None else dict(SCHEDULER_CLIENT_WEIGHTS)
+        self.aging_rate = aging_rate
+        self.name = name
+        self.queues: Dict[str, List[Job]] = {}
+        self.running: Dict[str, int] = {}
+        # 轮询顺序，以及当前轮到的客户端本轮剩余的次数
+        self._ring: Deque[str] = deque()
+        self._credits: Dict[str, int] = {}
+        # 任务运行时长的指数移动平均
+        self.average_runtime = DEFAULT_JOB_SECONDS
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    @property
+    def active(self) -> int:
+        return sum(self.running.values())
+
+    def submit(self, client: str, name: str, run: Callable[[], Awaitable], cost: float = 0.0) -> asyncio.Future:
+        """提交任务，返回任务结果的 Future；不需要结果时可以不等待"""
+        job = Job(client=client, name=name, run=run, cost=cost,
+                  future=asyncio.get_running_loop().create_future())
+        if client not in self.queues:
+            self.queues[client] = []
+            self._ring.append(client)
+        self.queues[client].append(job)
+        print(f"任务入队[{self.name}]: {name}（客户端 {client}，成本 {cost:.0f} 秒，"
+              f"排队 {self.queued} 个，运行 {self.active} 个）")
+        self._dispatch()
+        return job.future
+
+    def estimated_wait(self) -> float:
+        """按平均运行时长估计新任务需要等待的秒数"""
+        backlog = self.queued + self.active - self.max_concurrency + 1
+        return max(backlog, 0) * self.average_runtime / max(self.max_concurrency, 1)
+
+    def position(self, name: str) -> Optional[int]:
+        """
+        估计任务之前还会有多少个排队任务先开始（整个通道），不在队列中返回 None
+
+        任务在本客户端队列中排第 k 位时，需要轮询 k // weight + 1 轮才轮到它，
+        其间其他客户端每轮至多取出各自 weight 个任务；最后一轮只有轮询顺序在前的客户端先取
+        """
+        now = time.monotonic()
+        for client, queue in self.queues.items():
+            for job in queue:
+                if job.name == name:
+                    priority = job.priority(now, self.aging_rate)
+                    own = sum(1 for other in queue if other.priority(now, self.aging_rate) < priority)
+                    rounds = own // self.weights.get(client, 1) + 1
+                    ring = list(self._ring)
+                    others = 0
+                    for c, q in self.queues.items():
+                        if c != client:
+                            c_rounds = rounds if ring.index(c) < ring.index(client) else rounds - 1
+                            others += min(len(q), c_rounds * self.weights.get(c, 1))
+                    return own + others
+        return None
+
+    def _pop_best(self, queue: List[Job]) -> Job:
+        """取出队列中优先级最高的任务，同优先级先到先得"""
+        now = time.monotonic()
+        best = min(range(len(queue)), key=lambda i: queue[i].priority(now, self.aging_rate))
+        return queue.pop(best)
+
+    def _next_job(self) -> Optional[Job]:
+        """加权轮询：每个客户端连续取出至多 weight 个任务后轮到下一个客户端"""
+        for _ in range(len(self._ring)):
+            client = self._ring[0]
+            queue = self.queues.get(client)
+            if queue and self.running.get(client, 0) < self.client_concurrency:
+                credits = self._credits.get(client) or self.weights.get(client, 1)
+                job = self._pop_best(queue)
+                credits -= 1
+                if credits <= 0:
+                    self._credits.pop(client, None)
+                    self._ring.rotate(-1)
+                else:
+                    self._credits[client] = credits
+                return job
+            # 队列已空时本轮剩余次数作废；只是达到并发上限时保留，下次轮到时继续使用
+            if not queue:
+                self._credits.pop(client, None)
+            self._ring.rotate(-1)
+        return None
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency:
+            job = self._next_job()
+            if job is None:
+                break
+            self.running[job.client] = self.running.get(job.client, 0) + 1
+            asyncio.create_task(self._run(job))
+        # 队列已空的客户端移出轮询
+        for client in [c for c, q in self.queues.items() if not q and not self.running.get(c)]:
+            del self.queues[client]
+            self._ring.remove(client)
+            self._credits.pop(client, None)
+
+    async def _run(self, job: Job):
+        print(f"任务开始[{self.name}]: {job.name}（客户端 {job.client}，"
+              f"等待 {time.monotonic() - job.submitted:.1f} 秒）")
+        started = time.monotonic()
+        try:
+            result = await job.run()
+            if not job.future.cancelled():
+                job.future.set_result(result)
+        except Exception as e:
+            if not job.future.cancelled():
+                job.future.set_exception(e)
+        finally:
+            self.average_runtime = 0.8 * self.average_runtime + 0.2 * (time.monotonic() - started)
+            count = self.running.get(job.client, 0) - 1
+            if count > 0:
+                self.running[job.client] = count
+            else:
+                self.running.pop(job.client, None)
+            self._dispatch()
+
+class LaneScheduler:
+    """交互通道和批量通道各一个 FairScheduler，按任务成本分流"""
+
+    def __init__(self, interactive_max_seconds: float = SCHEDULER_INTERACTIVE_MAX_SECONDS):
+        self.interactive_max_seconds = interactive_max_seconds
+        self.lanes: Dict[str, FairScheduler] = {
+            INTERACTIVE: FairScheduler(max_concurrency=SCHEDULER_INTERACTIVE_CONCURRENCY, name=INTERACTIVE),
+            BULK: FairScheduler(max_concurrency=SCHEDULER_MAX_CONCURRENCY, name=BULK),
+        }
+
+    @property
+    def queued(self) -> int:
+        return sum(lane.queued for lane in self.lanes.values())
+
+    @property
+    def active(self) -> int:
+        return sum(lane.active for lane in self.lanes.values())
+
+    def lane_for(self, cost: float) -> str:
+        return INTERACTIVE if cost <= self.interactive_max_seconds else BULK
+
+    def submit(self, client: str, name: str, run: Callable[[], Awaitable],
+               cost: float = 0.0, lane: Optional[str] = None) -> asyncio.Future:
+        """提交任务，未指定通道时按成本选择"""
+        return self.lanes[lane or self.lane_for(cost)].submit(client, name, run, cost)
+
+    def position(self, name: str) -> Optional[int]:
+        for lane in self.lanes.values():
+            position = lane.position(name)
+            if position is not None:
+                return position
+        return None
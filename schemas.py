@@ -2,8 +2,8 @@
 Pydantic 模式定义 - 用于数据验证和序列化
 """
 
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class VideoUploadResponse(BaseModel):
@@ -13,6 +13,34 @@ class VideoUploadResponse(BaseModel):
     size: int
     upload_time: datetime
 
+class MediaInfo(BaseModel):
+    """媒体信息（上传时探测一次）"""
+    format_name: str
+    duration: float
+    size: int
+    bit_rate: int
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    width: int = 0
+    height: int = 0
+    frame_rate: float = 0.0
+    sample_rate: int = 0
+    channels: int = 0
+    sample_fmt: Optional[str] = None
+    streams: List[Dict] = []
+
+class VideoInfo(BaseModel):
+    """视频详情"""
+    video_id: str
+    filename: str
+    size: int
+    upload_time: datetime
+    duration: float
+    media_info: Optional[MediaInfo] = None
+    has_proxy: bool = False
+    has_waveform: bool = False
+    transcript_complete: bool = False
+
 class TranscriptSegment(BaseModel):
     """转录片段"""
     id: str
@@ -35,13 +63,40 @@ class SplitSegmentRequest(BaseModel):
     split_points: List[float]  # 时间点列表
     new_text: Optional[str] = None  # 新的文本内容（用于按文本分割）
 
+class RetranscribeRequest(BaseModel):
+    """局部重新识别请求：指定片段ID或时间范围（秒）"""
+    segment_ids: Optional[List[str]] = None
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+
+class RetranscribeResponse(BaseModel):
+    """局部重新识别结果"""
+    removed_segment_ids: List[str]
+    new_segments: List[TranscriptSegment]
+
+class SearchHit(BaseModel):
+    """检索命中的片段"""
+    video_id: str
+    segment_id: str
+    text: str
+    start_time: float
+    end_time: float
+    score: float
+
+class SearchResponse(BaseModel):
+    """全文检索结果"""
+    query: str
+    total: int
+    hits: List[SearchHit]
+
 class ExportRequest(BaseModel):
     """导出请求"""
     mode: str  # "merge" 或 "batch"
     segment_order: List[str]
     format: str = "mp4"  # "mp4", "avi", "mov"
-    quality: str = "medium"  # "low", "medium", "high"
+    quality: str = "medium"  # "low", "medium", "high", "preview"（快速预览草稿，忽略分辨率设置）
     resolution: str = "original"  # "original", "720p", "1080p"
+    workers: int = Field(1, ge=1, le=16)  # 合并模式的并行编码进程数，大于1时启用分块并行编码（另受 CPU 核数和 EXPORT_MAX_WORKERS 限制）
 
 class ExportResponse(BaseModel):
     """导出响应"""
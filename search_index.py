@@ -0,0 +1,134 @@
+"""
+全文检索 - 所有转录片段的倒排索引，中文按字二元组切分，BM25 排序
+
+索引随 Database 的转录写入增量更新，不需要重建
+"""
+
+import re
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# BM25 参数
+K1 = 1.2
+B = 0.75
+# 片段原文包含完整查询串时的额外得分
+EXACT_MATCH_BONUS = 2.0
+
+# 连续的中日韩字符，或连续的字母数字
+_TOKEN_RUN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+|[0-9a-zA-Z]+")
+
+def tokenize(text: str) -> List[str]:
+    """中文按相邻两字切分（单字成词时保留单字），英文和数字按整词"""
+    tokens = []
+    for run in _TOKEN_RUN.findall(text.lower()):
+        if run[0].isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+class SearchIndex:
+    """segment_id -> 词频 的倒排索引"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}  # 词 -> {segment_id: 词频}
+        self.doc_terms: Dict[str, Counter] = {}  # segment_id -> 词频
+        self.doc_lengths: Dict[str, int] = {}
+        self.segments: Dict[str, object] = {}  # segment_id -> TranscriptSegment
+        self.indexed_text: Dict[str, str] = {}
+        self.video_docs: Dict[str, set] = {}  # video_id -> segment_id 集合
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def add(self, segment):
+        """索引或重新索引一个片段"""
+        with self._lock:
+            self._remove(segment.id)
+            terms = Counter(tokenize(segment.text))
+            for term, count in terms.items():
+                self.postings.setdefault(term, {})[segment.id] = count
+            length = sum(terms.values())
+            self.doc_terms[segment.id] = terms
+            self.doc_lengths[segment.id] = length
+            self.segments[segment.id] = segment
+            self.indexed_text[segment.id] = segment.text
+            self.video_docs.setdefault(segment.video_id, set()).add(segment.id)
+            self.total_length += length
+
+    def remove(self, segment_id: str):
+        with self._lock:
+            self._remove(segment_id)
+
+    def sync_video(self, video_id: str, segments: List):
+        """使索引与视频的当前片段一致：删除已不存在的片段，只重新索引新增或文本变化的片段"""
+        current = {segment.id for segment in segments}
+        with self._lock:
+            stale = [sid for sid in self.video_docs.get(video_id, ()) if sid not in current]
+            for segment_id in stale:
+                self._remove(segment_id)
+        for segment in segments:
+            if self.indexed_text.get(segment.id) != segment.text or self.segments.get(segment.id) is not segment:
+                self.add(segment)
+
+    def remove_video(self, video_id: str):
+        with self._lock:
+            for segment_id in list(self.video_docs.get(video_id, ())):
+                self._remove(segment_id)
+            self.video_docs.pop(video_id, None)
+
+    def _remove(self, segment_id: str):
+        terms = self.doc_terms.pop(segment_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(segment_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(segment_id, 0)
+        segment = self.segments.pop(segment_id, None)
+        self.indexed_text.pop(segment_id, None)
+        if segment is not None:
+            self.video_docs.get(segment.video_id, set()).discard(segment_id)
+
+    def search(self, query: str, video_id: Optional[str] = None, limit: int = 20) -> Tuple[int, List[Tuple[float, object]]]:
+        """返回 (命中总数, [(得分, 片段)])，按 BM25 得分从高到低"""
+        terms = set(tokenize(query))
+        if not terms:
+            return 0, []
+        needle = query.strip().lower()
+
+        with self._lock:
+            doc_count = len(self.doc_terms)
+            if doc_count == 0:
+                return 0, []
+            average_length = self.total_length / doc_count or 1.0
+            scores: Dict[str, float] = {}
+            for term in terms:
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for segment_id, tf in docs.items():
+                    norm = K1 * (1 - B + B * self.doc_lengths[segment_id] / average_length)
+                    scores[segment_id] = scores.get(segment_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+            hits = []
+            for segment_id, score in scores.items():
+                segment = self.segments[segment_id]
+                if video_id and segment.video_id != video_id:
+                    continue
+                if needle and needle in segment.text.lower():
+                    score += EXACT_MATCH_BONUS
+                hits.append((score, segment))
+
+        hits.sort(key=lambda hit: (-hit[0], hit[1].video_id, hit[1].start_time))
+        return len(hits), hits[:limit]
@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # 创建必要的目录
-mkdir -p uploads temp
+mkdir -p "${TEMP_DIR:-temp}" "${STATE_DIR:-temp/state}" "${UPLOAD_DIR:-temp/state/uploads}"
 
 # 设置环境变量
 export PYTHONPATH=/app
@@ -0,0 +1,303 @@
+"""
+存储管理 - 跟踪上传目录与 temp/ 下的所有产物，按配额、TTL 和 LRU 清理磁盘
+
+Render 上只有 temp/ 挂载了持久磁盘，原始上传和检查点数据库放在其下的 state/ 中，
+重新部署后仍然存在；state/ 整体不会被当作产物清理或淘汰，其中的上传文件仍按产物管理
+"""
+
+import os
+import time
+import shutil
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# 临时文件与派生产物目录
+TEMP_DIR = os.getenv("TEMP_DIR", "temp")
+# 需要跨重启保留的状态（原始上传、检查点数据库、任务队列），放在持久磁盘上
+STATE_DIR = os.getenv("STATE_DIR", os.path.join(TEMP_DIR, "state"))
+# 原始上传目录
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(STATE_DIR, "uploads"))
+
+# 崩溃后遗留的中间文件前缀，启动时直接清理
+ORPHAN_PREFIXES = ("chunk_", "local_chunk_", "part_", "concat_")
+
+# 按视频ID命名的派生产物: 文件名前缀 -> 类型，文件名为 {前缀}{video_id}.{扩展名}
+DERIVED_PREFIXES = {
+    "proxy_": "proxy",
+    "peaks_": "waveform",
+    "thumbs_": "thumbnails",
+    "audio_": "audio",  # 音频缓存按内容键命名，接管时所有者暂记为该键
+}
+
+# 各类产物的默认存活时间（小时）
+DEFAULT_TTL_HOURS = {
+    "upload": 72,
+    "proxy": 72,
+    "waveform": 72,
+    "thumbnails": 72,
+    "export": 24,
+    "audio": 6,
+    "temp": 6,
+}
+
+class StorageFullError(Exception):
+    """磁盘空间不足，无法接受新的工作"""
+    pass
+
+@dataclass
+class StoredArtifact:
+    """磁盘上的一个产物"""
+    path: str
+    owner: str  # 所属视频ID
+    kind: str  # "upload", "proxy", "waveform", "export", "audio", "temp" ...
+    size: int
+    created_at: float = field(default_factory=time.time)
+    last_access: float = field(default_factory=time.time)
+
+class StorageManager:
+    """按所有者和类型跟踪产物，执行配额、TTL 和 LRU 淘汰"""
+
+    def __init__(self, roots: List[str], quota_bytes: Optional[int] = None,
+                 min_free_bytes: Optional[int] = None, ttl_hours: Optional[Dict[str, float]] = None,
+                 reserved: Optional[List[str]] = None):
+        self.roots = roots
+        # 位于某个根目录下、但不属于产物的目录（状态目录、嵌套的其他根目录），清理时跳过
+        self.reserved = {os.path.abspath(path) for path in (reserved or []) + roots}
+        self.quota_bytes = quota_bytes if quota_bytes is not None else int(os.getenv("STORAGE_QUOTA_BYTES", 8 * 1024 ** 3))
+        self.min_free_bytes = min_free_bytes if min_free_bytes is not None else int(os.getenv("STORAGE_MIN_FREE_BYTES", 512 * 1024 ** 2))
+
+        self.ttl_hours = dict(DEFAULT_TTL_HOURS)
+        for kind in DEFAULT_TTL_HOURS:
+            env_value = os.getenv(f"STORAGE_TTL_{kind.upper()}_HOURS")
+            if env_value:
+                self.ttl_hours[kind] = float(env_value)
+        if ttl_hours:
+            self.ttl_hours.update(ttl_hours)
+
+        self.artifacts: Dict[str, StoredArtifact] = {}
+        # 正在被任务使用的所有者，其产物不会被淘汰
+        self.active_owners: Dict[str, int] = {}
+        # 产物被淘汰后的回调，参数为被淘汰的产物
+        self.eviction_hooks: List[Callable[[StoredArtifact], None]] = []
+        self._lock = threading.RLock()
+
+    def register(self, path: str, owner: str, kind: str) -> Optional[StoredArtifact]:
+        """登记一个新产物"""
+        if not os.path.exists(path):
+            return None
+        key = os.path.abspath(path)
+        artifact = StoredArtifact(path=path, owner=owner, kind=kind, size=self._path_size(path))
+        with self._lock:
+            self.artifacts[key] = artifact
+        return artifact
+
+    def touch(self, path: str):
+        """记录一次访问，用于 LRU 排序"""
+        with self._lock:
+            artifact = self.artifacts.get(os.path.abspath(path))
+            if artifact:
+                artifact.last_access = time.time()
+
+    def remove(self, path: str) -> bool:
+        """删除产物文件并取消跟踪"""
+        with self._lock:
+            self.artifacts.pop(os.path.abspath(path), None)
+        return self._delete_path(path)
+
+    def remove_owner(self, owner: str):
+        """删除某个视频的所有产物"""
+        with self._lock:
+            paths = [a.path for a in self.artifacts.values() if a.owner == owner]
+        for path in paths:
+            self.remove(path)
+
+    def acquire(self, owner: str):
+        """标记所有者正在被任务使用"""
+        with self._lock:
+            self.active_owners[owner] = self.active_owners.get(owner, 0) + 1
+
+    def release(self, owner: str):
+        """任务结束，所有者的产物重新参与淘汰"""
+        with self._lock:
+            count = self.active_owners.get(owner, 0) - 1
+            if count > 0:
+                self.active_owners[owner] = count
+            else:
+                self.active_owners.pop(owner, None)
+
+    def usage(self) -> int:
+        """已跟踪产物的总字节数"""
+        with self._lock:
+            return sum(a.size for a in self.artifacts.values())
+
+    def free_bytes(self) -> int:
+        """存储目录所在磁盘的剩余空间"""
+        return min(shutil.disk_usage(root).free for root in self.roots if os.path.exists(root))
+
+    def enforce(self, extra_bytes: int = 0) -> int:
+        """
+        清理过期产物，并按最近最少使用淘汰，直到为 extra_bytes 腾出配额
+
+        返回释放的字节数
+        """
+        now = time.time()
+        freed = 0
+        with self._lock:
+            candidates = [a for a in self.artifacts.values() if a.owner not in self.active_owners]
+
+            # 1. TTL 过期
+            for artifact in candidates:
+                ttl = self.ttl_hours.get(artifact.kind, self.ttl_hours["temp"]) * 3600
+                if now - artifact.last_access > ttl:
+                    freed += self._evict(artifact)
+
+            # 2. 超出配额时按 LRU 淘汰，原始上传最后淘汰
+            candidates = [a for a in self.artifacts.values() if a.owner not in self.active_owners]
+            candidates.sort(key=lambda a: (a.kind == "upload", a.last_access))
+            for artifact in candidates:
+                if self.usage() + extra_bytes <= self.quota_bytes and self.free_bytes() - extra_bytes >= self.min_free_bytes:
+                    break
+                # 淘汰原始上传时会连带删除同一视频的其他产物，已删除的返回 0
+                freed += self._evict(artifact)
+
+        if freed:
+            print(f"存储清理完成，释放 {freed / (1024*1024):.2f} MB")
+        return freed
+
+    def evict_kind(self, kind: str, max_bytes: int) -> int:
+        """按最近最少使用淘汰某类产物，直到该类总大小不超过 max_bytes"""
+        freed = 0
+        with self._lock:
+            artifacts = [a for a in self.artifacts.values() if a.kind == kind]
+            total = sum(a.size for a in artifacts)
+            candidates = sorted(
+                (a for a in artifacts if a.owner not in self.active_owners),
+                key=lambda a: a.last_access
+            )
+            for artifact in candidates:
+                if total <= max_bytes:
+                    break
+                total -= artifact.size
+                freed += self._evict(artifact)
+        return freed
+
+    def ensure_capacity(self, needed_bytes: int):
+        """
+        确保有足够空间开始新的工作，必要时先淘汰旧产物
+
+        空间仍不足时抛出 StorageFullError，而不是让任务在编码中途失败
+        """
+        self.enforce(needed_bytes)
+        if self.usage() + needed_bytes > self.quota_bytes:
+            raise StorageFullError(
+                f"存储配额不足: 已用 {self.usage() / (1024*1024):.0f} MB，"
+                f"需要 {needed_bytes / (1024*1024):.0f} MB，配额 {self.quota_bytes / (1024*1024):.0f} MB"
+            )
+        if self.free_bytes() - needed_bytes < self.min_free_bytes:
+            raise StorageFullError(f"磁盘剩余空间不足: 剩余 {self.free_bytes() / (1024*1024):.0f} MB")
+
+    def sweep_orphans(self, delete_orphans: bool = True):
+        """
+        启动时清理崩溃遗留的中间文件，并接管其余未跟踪的文件
+
+        接管的文件以修改时间作为最近访问时间，随后按 TTL 正常过期；
+        目录与其他进程共享时（队列模式的 worker）中间文件可能正在使用，delete_orphans=False 时不处理
+        """
+        removed = 0
+        adopted = 0
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                if self._is_reserved(path):
+                    continue
+                if name.startswith(ORPHAN_PREFIXES):
+                    if delete_orphans and self._delete_path(path):
+                        removed += 1
+                    continue
+
+                key = os.path.abspath(path)
+                with self._lock:
+                    if key in self.artifacts:
+                        continue
+                kind = self._guess_kind(root, name)
+                artifact = self.register(path, owner=self._guess_owner(kind, name), kind=kind)
+                if artifact:
+                    artifact.last_access = os.path.getmtime(path)
+                    adopted += 1
+
+        print(f"启动清理: 删除 {removed} 个遗留文件，接管 {adopted} 个已有文件")
+        self.enforce()
+
+    def _is_reserved(self, path: str) -> bool:
+        """路径是保留目录，或包含保留目录"""
+        path = os.path.abspath(path)
+        return any(reserved == path or reserved.startswith(path + os.sep) for reserved in self.reserved)
+
+    def _guess_kind(self, root: str, name: str) -> str:
+        """根据目录和文件名推断已有文件的类型"""
+        if os.path.abspath(root) == os.path.abspath(self.roots[0]):
+            return "upload"
+        if name.startswith("export_"):
+            return "export"
+        for prefix, kind in DERIVED_PREFIXES.items():
+            if name.startswith(prefix):
+                return kind
+        if name.endswith(".wav"):
+            return "audio"
+        return "temp"
+
+    @staticmethod
+    def _guess_owner(kind: str, name: str) -> str:
+        """上传文件名为 {video_id}_{原文件名}，派生产物文件名为 {前缀}{video_id}.{扩展名}"""
+        for prefix, derived_kind in DERIVED_PREFIXES.items():
+            if kind == derived_kind:
+                return os.path.splitext(name)[0][len(prefix):]
+        return name.split("_")[0]
+
+    def _evict(self, artifact: StoredArtifact) -> int:
+        """淘汰一个产物；原始上传被淘汰时连带删除该视频的其他产物"""
+        key = os.path.abspath(artifact.path)
+        if key not in self.artifacts:
+            return 0
+        print(f"淘汰产物: {artifact.path} ({artifact.kind}, {artifact.size / (1024*1024):.2f} MB)")
+        del self.artifacts[key]
+        self._delete_path(artifact.path)
+        freed = artifact.size
+
+        if artifact.kind == "upload":
+            related = [a for a in self.artifacts.values() if a.owner == artifact.owner]
+            for other in related:
+                freed += self._evict(other)
+
+        for hook in self.eviction_hooks:
+            try:
+                hook(artifact)
+            except Exception as e:
+                print(f"淘汰回调失败: {e}")
+        return freed
+
+    @staticmethod
+    def _path_size(path: str) -> int:
+        if os.path.isdir(path):
+            return sum(
+                os.path.getsize(os.path.join(dirpath, f))
+                for dirpath, _, files in os.walk(path) for f in files
+            )
+        return os.path.getsize(path)
+
+    @staticmethod
+    def _delete_path(path: str) -> bool:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+            else:
+                return False
+            return True
+        except OSError as e:
+            print(f"删除文件失败 {path}: {e}")
+            return False
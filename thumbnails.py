@@ -0,0 +1,134 @@
+"""
+片段缩略图雪碧图 - 单次 ffmpeg 解码提取每个片段起始帧，拼接为雪碧图并生成 JSON 索引
+"""
+
+import os
+import re
+import json
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional
+import ffmpeg
+
+TILE_WIDTH = 160
+TILE_HEIGHT = 90
+COLUMNS = 10
+ROWS = 10
+
+INDEX_FILENAME = "index.json"
+
+# showinfo 滤镜为每个通过的帧输出一行，其中 pts_time 为该帧的时间
+_SHOWINFO_PTS = re.compile(r"\[Parsed_showinfo[^\]]*\].*?\bn:\s*(\d+).*?\bpts_time:\s*([-\d.]+)")
+
+def _time_key(t: float) -> str:
+    """缩略图按0.1秒取整缓存，拆分出的片段与原片段起点相同时直接复用"""
+    return f"{max(0.0, t):.1f}"
+
+class ThumbnailSprites:
+    """
+    管理一个视频的缩略图雪碧图缓存
+
+    目录结构: {cache_dir}/index.json 与 sheet_{批次}_{序号}.jpg
+    新增片段只提取缓存中没有的时间点，并写入新的雪碧图批次
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, INDEX_FILENAME)
+        self._lock = threading.Lock()
+
+    def load_index(self) -> Optional[Dict]:
+        if not os.path.exists(self.index_path):
+            return None
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _empty_index(self) -> Dict:
+        return {
+            "tile_width": TILE_WIDTH,
+            "tile_height": TILE_HEIGHT,
+            "columns": COLUMNS,
+            "rows": ROWS,
+            "batches": 0,
+            "sheets": [],
+            "frames": {},  # 时间键 -> {"sheet": 序号, "x": 像素, "y": 像素}
+            "segments": {},  # 片段ID -> 时间键
+        }
+
+    def update(self, video_path: str, segments: List) -> Dict:
+        """为所有片段补齐缩略图并更新索引，返回最新索引"""
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            index = self.load_index() or self._empty_index()
+
+            wanted = {seg.id: _time_key(seg.start_time) for seg in segments}
+            missing = sorted({key for key in wanted.values() if key not in index["frames"]}, key=float)
+
+            if missing:
+                self._extract_batch(video_path, missing, index)
+
+            index["segments"] = {seg_id: key for seg_id, key in wanted.items() if key in index["frames"]}
+
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+            return index
+
+    def _extract_batch(self, video_path: str, time_keys: List[str], index: Dict):
+        """
+        单次解码选出各时间点之后的第一帧，缩放后由 tile 滤镜直接拼成雪碧图
+
+        多个时间点落在同一帧间隔内（低帧率或可变帧率）时只选出一帧，超出时长的时间点没有帧，
+        因此按 showinfo 报告的帧时间把时间点对应到图块，而不是假定每个时间点一帧
+        """
+        batch = index["batches"]
+        pattern = os.path.join(self.cache_dir, f"sheet_{batch}_%03d.jpg")
+
+        # 每个时间点选中第一个 t >= ti 的帧
+        select_expr = "+".join(f"gte(t,{key})*not(gte(prev_t,{key}))" for key in time_keys)
+
+        _, stderr = (
+            ffmpeg
+            .input(video_path)
+            .video
+            .filter("select", select_expr)
+            .filter("showinfo")
+            .filter("scale", TILE_WIDTH, TILE_HEIGHT, force_original_aspect_ratio="decrease")
+            .filter("pad", TILE_WIDTH, TILE_HEIGHT, "(ow-iw)/2", "(oh-ih)/2")
+            .filter("tile", f"{COLUMNS}x{ROWS}")
+            .output(pattern, vsync="vfr", **{"q:v": 4})
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True, quiet=True)
+        )
+
+        # 选出的帧按顺序排列，第 i 帧就是第 i 个图块
+        frame_times = {}
+        for line in stderr.decode("utf-8", errors="ignore").splitlines():
+            match = _SHOWINFO_PTS.search(line)
+            if match:
+                frame_times[int(match.group(1))] = float(match.group(2))
+        pts = [frame_times[n] for n in sorted(frame_times)]
+
+        per_sheet = COLUMNS * ROWS
+        sheet_files = sorted(f for f in os.listdir(self.cache_dir) if f.startswith(f"sheet_{batch}_"))
+        tile_count = min(len(pts), len(sheet_files) * per_sheet)
+
+        sheet_offset = len(index["sheets"])
+        index["sheets"].extend(sheet_files)
+        mapped = 0
+        for key in time_keys:
+            # 时间点对应的是第一个 t >= 时间点 的选中帧；超出时长的时间点没有帧，不登记
+            i = bisect_left(pts, float(key) - 1e-4)
+            if i >= tile_count:
+                continue
+            position = i % per_sheet
+            index["frames"][key] = {
+                "sheet": sheet_offset + i // per_sheet,
+                "x": (position % COLUMNS) * TILE_WIDTH,
+                "y": (position // COLUMNS) * TILE_HEIGHT,
+            }
+            mapped += 1
+        index["batches"] = batch + 1
+
+        print(f"缩略图提取完成: {tile_count} 帧对应 {mapped} 个时间点，{len(sheet_files)} 张雪碧图")
@@ -4,41 +4,180 @@
 
 import os
 import uuid
+import time
 import asyncio
-from typing import List, Tuple
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 import ffmpeg
 from pydub import AudioSegment
 import json
-from tencentcloud.common import credential
-from tencentcloud.common.profile.client_profile import ClientProfile
-from tencentcloud.common.profile.http_profile import HttpProfile
-from tencentcloud.asr.v20190614 import asr_client, models
+from tencentcloud.asr.v20190614 import models
 import base64
-from models import TranscriptSegment, Database, ProcessingTask
+import io
+from models import Video, TranscriptSegment, Database, ProcessingTask
+from parallel_export import export_parallel, resize_for_export, encoder_options
+from storage_manager import StorageManager, StorageFullError, STATE_DIR, TEMP_DIR, UPLOAD_DIR
+from audio_cache import AudioCache
+from waveform import build_peak_pyramid
+from thumbnails import ThumbnailSprites
+from keyframe_index import KeyframeIndex
+from media_probe import MediaInfo, probe_media, is_asr_ready_wav
+from asr_providers import ChunkCallback, create_provider
+from asr_client_manager import TencentASRClientManager
+from asr_callbacks import CompletionRegistry
+from word_timing import TimedText, WordTimingIndex, shift_result, words_of
+from job_store import JobStore, JobRecord, STAGE_EXTRACTING, STAGE_TRANSCRIBING
+
+# 发送给腾讯云的音频编码: "mp3"、"ogg-opus"、"m4a"，或 "wav" 表示不压缩
+ASR_TRANSPORT_FORMAT = os.getenv("ASR_TRANSPORT_FORMAT", "mp3")
+ASR_TRANSPORT_BITRATE = os.getenv("ASR_TRANSPORT_BITRATE", "32k")
+# 单次识别请求的音频数据上限（字节）和单段最长时长（秒）
+ASR_MAX_REQUEST_BYTES = int(os.getenv("ASR_MAX_REQUEST_BYTES", 10 * 1024 * 1024))
+ASR_MAX_CHUNK_SECONDS = int(os.getenv("ASR_MAX_CHUNK_SECONDS", 1800))
+# 轮询识别结果的基础超时（秒），实际上限再加上音频时长
+ASR_POLL_TIMEOUT = int(os.getenv("ASR_POLL_TIMEOUT", 120))
+# 识别完成回调地址（指向本服务的 /asr/callback），配置后轮询只作为兜底
+ASR_CALLBACK_URL = os.getenv("ASR_CALLBACK_URL", "")
+# 使用回调时兜底查询任务状态的间隔（秒）
+ASR_CALLBACK_POLL_INTERVAL = int(os.getenv("ASR_CALLBACK_POLL_INTERVAL", 60))
+# 是否请求词级时间戳（ResTextFormat 1），用于精确分割片段
+ASR_WORD_TIMING = os.getenv("ASR_WORD_TIMING", "1") == "1"
+# 本地备选识别的并行线程数
+LOCAL_RECOGNITION_WORKERS = int(os.getenv("LOCAL_RECOGNITION_WORKERS", 4))
+
+# 传输格式对应的 pydub 导出参数
+TRANSPORT_EXPORT_ARGS = {
+    "mp3": {"format": "mp3"},
+    "ogg-opus": {"format": "ogg", "codec": "libopus"},
+    "m4a": {"format": "ipod", "codec": "aac"},
+}
+
+# 代理文件的高度（像素），设为0时不生成代理
+PROXY_HEIGHT = int(os.getenv("PROXY_HEIGHT", 360))
+
+class TranscriptStream:
+    """
+    识别结果逐块写入转录
+
+    片段ID按发布顺序编号且不复用，开始时间必须单调递增，
+    与已发布片段重叠的结果（分段重叠区或回退识别的重复部分）被跳过；
+    写入的结果交给 checkpoint 持久化，重启后按原顺序重新发布即可恢复同样的片段；
+    任务被取消（如 worker 丢失租约）后识别线程仍可能交回结果，close() 之后的结果全部丢弃
+    """
+
+    def __init__(self, video_id: str, duration: float, task: ProcessingTask = None,
+                 checkpoint: Callable[[List[Tuple[str, float, float]]], None] = None):
+        self.video_id = video_id
+        self.duration = duration
+        self.task = task
+        self.checkpoint = checkpoint
+        self.count = 0
+        self.last_start = -1.0
+        self.last_end = 0.0
+        self.closed = False
+
+    def close(self):
+        """停止接收结果，不再写入转录和检查点"""
+        self.closed = True
+
+    def publish(self, results: List[Tuple[str, float, float]], checkpoint: bool = True):
+        if self.closed:
+            return
+        segments = []
+        accepted = []
+        for result in results:
+            text, start_time, end_time = result
+            # 验证时间戳
+            if start_time < 0:
+                start_time = 0.0
+            if end_time <= start_time:
+                end_time = start_time + 1.0
+            if start_time <= self.last_start or start_time < self.last_end:
+                continue
+            
+            # 清理文本
+            cleaned_text = text.strip()
+            if not cleaned_text:
+                cleaned_text = "（无文本内容）"
+            
+            segment_id = f"seg_{self.video_id}_{self.count}"
+            Database.set_word_timing(self.video_id, segment_id,
+                                     WordTimingIndex.from_words(cleaned_text, words_of(result)))
+            segments.append(TranscriptSegment(
+                id=segment_id,
+                video_id=self.video_id,
+                text=cleaned_text,
+                start_time=start_time,
+                end_time=end_time,
+                order=self.count
+            ))
+            accepted.append(TimedText(cleaned_text, start_time, end_time, words_of(result)))
+            print(f"片段 {self.count + 1}: {start_time:.1f}s - {end_time:.1f}s, 文本: {cleaned_text[:50]}...")
+            self.count += 1
+            self.last_start = start_time
+            self.last_end = end_time
+        
+        if not segments:
+            return
+        Database.append_segments(self.video_id, segments)
+        if checkpoint and self.checkpoint:
+            self.checkpoint(accepted)
+        
+        # 识别阶段占总进度的 30% - 90%
+        if self.task and self.duration > 0 and self.task.status == "processing":
+            self.task.progress = max(self.task.progress, 30 + int(60 * min(self.last_end / self.duration, 1.0)))
+            self.task.message = f"正在进行语音识别，已生成 {self.count} 个片段..."
 
 class VideoProcessor:
     """视频处理器 - 使用腾讯云语音识别API"""
     
-    def __init__(self, upload_dir: str = "uploads", temp_dir: str = "temp"):
+    def __init__(self, upload_dir: str = UPLOAD_DIR, temp_dir: str = TEMP_DIR):
         self.upload_dir = upload_dir
         self.temp_dir = temp_dir
         os.makedirs(upload_dir, exist_ok=True)
         os.makedirs(temp_dir, exist_ok=True)
         
+        # 磁盘配额与产物生命周期管理
+        self.storage = StorageManager([upload_dir, temp_dir], reserved=[STATE_DIR])
+        # 已提取音频的缓存，按源文件内容索引
+        self.audio_cache = AudioCache(temp_dir, self.storage)
+        # 未完成处理任务的检查点，重启后据此恢复
+        self.jobs = JobStore()
+        
         # 从环境变量获取腾讯云配置
         self.secret_id = os.getenv('TENCENT_SECRET_ID')
         self.secret_key = os.getenv('TENCENT_SECRET_KEY')
         
+        # 共享的腾讯云ASR客户端：长连接复用、自适应并发、重试预算和熔断
+        self.asr_clients = TencentASRClientManager(self.secret_id or "", self.secret_key or "")
+        # 回调推送的识别结果登记表
+        self.asr_callbacks = CompletionRegistry()
+        # 每个视频一个缩略图缓存实例，其锁使同一视频的更新依次进行
+        self._thumbnail_sprites: Dict[str, ThumbnailSprites] = {}
+        
         # 当前处理的音频文件路径
         self.current_audio_file = None
         
+        # 识别提供者：主提供者和失败时的备选
+        self.asr_provider = create_provider(os.getenv('ASR_PROVIDER', 'tencent'), self)
+        self.fallback_provider = create_provider(os.getenv('ASR_FALLBACK_PROVIDER', 'speech_recognition'), self)
+        
         # 检查配置
         if not self.secret_id or not self.secret_key:
             print("警告: 未配置腾讯云API密钥，将使用本地识别作为备选")
     
-    async def extract_audio(self, video_path: str) -> str:
-        """从视频中提取音频"""
+    async def extract_audio(self, video_path: str, proxy_path: str = None,
+                            media_info: MediaInfo = None) -> str:
+        """
+        从视频中提取音频
+
+        指定 proxy_path 时在同一次解码中同时输出低码率代理文件：
+        视频源生成缩小的视频代理，纯音频源生成只含音频的代理。
+        传入上传时缓存的 media_info 可避免再次运行 ffprobe
+        """
         audio_path = os.path.join(self.temp_dir, f"{uuid.uuid4()}.wav")
         
         try:
@@ -55,25 +194,49 @@ class VideoProcessor:
             
             # 使用 ffmpeg 提取音频，转换为16kHz单声道WAV格式（腾讯云要求）
             # 添加更多的错误处理和参数验证
-            probe = ffmpeg.probe(video_path)
-            duration = float(probe['format']['duration'])
+            if media_info is None:
+                media_info = probe_media(video_path)
+            duration = media_info.duration
             print(f"视频时长: {duration:.2f} 秒")
             
-            (
-                ffmpeg
-                .input(video_path)
-                .output(
-                    audio_path, 
-                    acodec='pcm_s16le', 
-                    ac=1, 
-                    ar='16000',
-                    vn=None,  # 禁用视频流
-                    y=None    # 覆盖输出文件
-                )
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True, quiet=True)
+            # 16kHz 单声道 16bit PCM 每秒 32000 字节，空间不足时在解码前拒绝
+            self.storage.ensure_capacity(int(duration * 32000))
+            
+            if media_info.has_video:
+                source = ffmpeg.input(video_path)
+            else:
+                # 纯音频源：在输入端屏蔽视频（封面图）、字幕和数据流，只解复用和解码音频
+                source = ffmpeg.input(video_path, vn=None, sn=None, dn=None)
+            audio_output = source['a:0'].output(
+                audio_path, 
+                acodec='pcm_s16le', 
+                ac=1, 
+                ar='16000'
             )
             
+            proxy_output = None
+            if proxy_path:
+                proxy_output = self._proxy_output(source, proxy_path, media_info.has_video)
+            
+            if proxy_output is not None:
+                try:
+                    # 一次解码同时写出识别用音频和代理文件
+                    (
+                        ffmpeg
+                        .merge_outputs(audio_output, proxy_output)
+                        .overwrite_output()
+                        .run(capture_stdout=True, capture_stderr=True, quiet=True)
+                    )
+                except ffmpeg.Error as e:
+                    # 代理生成失败不影响转录，退回只提取音频
+                    print(f"代理文件生成失败，仅提取音频: {e.stderr.decode('utf-8') if e.stderr else str(e)}")
+                    if os.path.exists(proxy_path):
+                        os.remove(proxy_path)
+                    proxy_output = None
+            
+            if proxy_output is None:
+                audio_output.overwrite_output().run(capture_stdout=True, capture_stderr=True, quiet=True)
+            
             # 验证生成的音频文件
             if not os.path.exists(audio_path):
                 raise FileNotFoundError("音频文件生成失败")
@@ -88,6 +251,8 @@ class VideoProcessor:
         except ffmpeg.Error as e:
             print(f"FFmpeg错误: {e.stderr.decode('utf-8') if e.stderr else str(e)}")
             raise Exception(f"音频提取失败: {str(e)}")
+        except StorageFullError:
+            raise
         except Exception as e:
             print(f"音频提取失败: {e}")
             import traceback
@@ -97,9 +262,47 @@ class VideoProcessor:
             audio.export(audio_path, format="wav")
             return audio_path
     
-    def recognize_speech_tencent(self, audio_file_path: str) -> List[Tuple[str, float, float]]:
+    @staticmethod
+    def _is_complete_extraction(audio_path: str, media_info: MediaInfo) -> bool:
+        """提取失败时 extract_audio 返回1秒静音占位，这类结果不放入缓存"""
+        try:
+            with wave.open(audio_path, "rb") as wav:
+                audio_duration = wav.getnframes() / float(wav.getframerate())
+        except (wave.Error, EOFError, OSError):
+            return False
+        return media_info.duration <= 0 or audio_duration >= media_info.duration * 0.9
+    
+    def _proxy_output(self, source, proxy_path: str, has_video: bool):
+        """构建代理文件的 ffmpeg 输出：小尺寸、低码率、关键帧密集以便快速拖动"""
+        if has_video:
+            video = source['v:0'].filter('scale', -2, PROXY_HEIGHT)
+            return ffmpeg.output(
+                video, source['a:0'], proxy_path,
+                vcodec='libx264',
+                preset='veryfast',
+                crf=30,
+                g=30,  # 每30帧一个关键帧，拖动时定位更快
+                pix_fmt='yuv420p',
+                acodec='aac',
+                audio_bitrate='64k',
+                ac=1,
+                movflags='+faststart'
+            )
+        return ffmpeg.output(
+            source['a:0'], proxy_path,
+            acodec='aac',
+            audio_bitrate='64k',
+            ac=1,
+            movflags='+faststart'
+        )
+    
+    def recognize_speech_tencent(self, audio_file_path: str,
+                                 on_chunk: ChunkCallback = None) -> List[Tuple[str, float, float]]:
         """
-        使用腾讯云语音识别API（普通话）- 直接传入整段音频文件
+        使用腾讯云语音识别API（普通话）
+
+        PCM 按 ASR_TRANSPORT_FORMAT 压缩后再发送，单次请求可以携带更长的音频；
+        编码后仍超过请求上限时按上限切分为多段，每段完成时调用 on_chunk
         """
         # 保存当前音频文件路径，用于后续获取实际时长
         self.current_audio_file = audio_file_path
@@ -116,215 +319,232 @@ class VideoProcessor:
             
             print(f"音频文件大小: {file_size / (1024*1024):.2f} MB")
             
-            # 获取音频文件的实际时长
-            actual_duration = 50.0  # 默认值
-            try:
-                audio = AudioSegment.from_wav(audio_file_path)
-                actual_duration_ms = len(audio)
-                actual_duration = actual_duration_ms / 1000.0
-                print(f"音频实际时长: {actual_duration}秒")
-            except Exception as e:
-                print(f"获取音频时长失败: {e}")
-            
             # 检查API配置
             if not self.secret_id or not self.secret_key:
-                print("腾讯云API密钥未配置，直接使用本地识别")
-                return self._fallback_local_recognition(audio_file_path)
+                print("腾讯云API密钥未配置，直接使用备选识别")
+                return self._fallback_recognize(audio_file_path)
             
-            print("使用腾讯云语音识别API处理音频（普通话）...")
+            # 读取音频并获取实际时长
+            audio = AudioSegment.from_wav(audio_file_path)
+            actual_duration = len(audio) / 1000.0
+            print(f"音频实际时长: {actual_duration}秒")
             
-            # 读取音频文件
-            with open(audio_file_path, 'rb') as f:
-                audio_data = f.read()
+            print(f"使用腾讯云语音识别API处理音频（普通话），传输格式: {ASR_TRANSPORT_FORMAT}...")
             
-            # 检查腾讯云API的限制（单次请求最大10MB）
-            if len(audio_data) > 10 * 1024 * 1024:  # 10MB限制
-                print(f"音频文件过大 ({len(audio_data) / (1024*1024):.2f} MB)，腾讯云API限制为10MB")
-                print("使用分段处理方式...")
-                return self._process_large_audio_tencent(audio_file_path)
+            # 按传输码率预估编码后的大小，明显超限时直接分段，避免整段编码浪费
+            if actual_duration * self._transport_bytes_per_second() > ASR_MAX_REQUEST_BYTES:
+                print("音频编码后将超过单次请求上限，使用分段处理方式...")
+                return self._process_large_audio_tencent(audio_file_path, audio, on_chunk)
             
-            # 检查音频时长
-            try:
-                audio = AudioSegment.from_wav(audio_file_path)
-                duration_seconds = len(audio) / 1000.0
-                print(f"音频时长: {duration_seconds:.2f} 秒")
-                
-                # 腾讯云API对时长也有一定限制，超过5分钟建议使用其他方式
-                if duration_seconds > 300:  # 5分钟
-                    print(f"音频较长 ({duration_seconds:.2f} 秒)，可能超出API处理能力")
-                    print("建议：使用较短的音频文件")
-                    return self._fallback_local_recognition(audio_file_path)
-            except Exception as e:
-                print(f"无法获取音频时长信息: {e}")
-            
-            # 初始化腾讯云客户端
-            cred = credential.Credential(self.secret_id, self.secret_key)
-            httpProfile = HttpProfile()
-            httpProfile.endpoint = "asr.tencentcloudapi.com"
-            
-            clientProfile = ClientProfile()
-            clientProfile.httpProfile = httpProfile
-            client = asr_client.AsrClient(cred, "", clientProfile)
-            
-            # 创建识别请求 - 直接传入整段音频
-            req = models.CreateRecTaskRequest()
-            params = {
-                "EngineModelType": "16k_zh",  # 使用标准普通话模型
-                "ChannelNum": 1,
-                "ResTextFormat": 0,
-                "SourceType": 1,
-                "Data": base64.b64encode(audio_data).decode()
-            }
-            req.from_json_string(json.dumps(params))
-            
-            print("发送腾讯云识别请求...")
-            # 发送请求
-            resp = client.CreateRecTask(req)
-            
-            if resp.Data and hasattr(resp.Data, 'TaskId'):
-                task_id = resp.Data.TaskId
-                print(f"腾讯云识别任务已创建，任务ID: {task_id}")
-                
-                # 轮询获取结果
-                return self._poll_tencent_result(client, task_id)
-            else:
-                print(f"腾讯云API返回无效响应: {resp}")
-                raise Exception("腾讯云API返回无效响应")
+            audio_data = self._encode_for_transport(audio)
+            print(f"编码后音频大小: {len(audio_data) / (1024*1024):.2f} MB")
+            
+            if len(audio_data) > ASR_MAX_REQUEST_BYTES:
+                print(f"音频数据过大 ({len(audio_data) / (1024*1024):.2f} MB)，使用分段处理方式...")
+                return self._process_large_audio_tencent(audio_file_path, audio, on_chunk)
+            
+            return self._recognize_tencent_data(audio_data, actual_duration)
             
         except Exception as e:
             print(f"腾讯云语音识别失败: {e}")
             import traceback
             traceback.print_exc()
             # 如果腾讯云失败，回退到本地识别
-            return self._fallback_local_recognition(audio_file_path)
+            return self._fallback_recognize(audio_file_path)
+    
+    def _transport_bytes_per_second(self) -> float:
+        """传输格式每秒音频的字节数"""
+        if ASR_TRANSPORT_FORMAT not in TRANSPORT_EXPORT_ARGS:
+            return 32000.0  # 16kHz 单声道 16bit PCM
+        return int(ASR_TRANSPORT_BITRATE.lower().rstrip("k")) * 1000 / 8.0
     
-    def _poll_tencent_result(self, client, task_id: int, max_attempts: int = 30) -> List[Tuple[str, float, float]]:
-        """轮询腾讯云识别结果"""
-        print(f"开始轮询腾讯云识别结果，任务ID: {task_id}")
+    def _encode_for_transport(self, audio: AudioSegment) -> bytes:
+        """将 PCM 编码为发送给腾讯云的格式（每段只编码一次）"""
+        buffer = io.BytesIO()
+        if ASR_TRANSPORT_FORMAT not in TRANSPORT_EXPORT_ARGS:
+            audio.export(buffer, format="wav")
+        else:
+            audio.export(buffer, bitrate=ASR_TRANSPORT_BITRATE, **TRANSPORT_EXPORT_ARGS[ASR_TRANSPORT_FORMAT])
+        return buffer.getvalue()
+    
+    def _recognize_tencent_data(self, audio_data: bytes, duration: float) -> List[Tuple[str, float, float]]:
+        """发送一段已编码的音频并等待识别结果"""
+        # 创建识别请求 - 腾讯云根据数据内容识别 wav/mp3/ogg-opus/m4a 等格式
+        req = models.CreateRecTaskRequest()
+        params = {
+            "EngineModelType": "16k_zh",  # 使用标准普通话模型
+            "ChannelNum": 1,
+            "ResTextFormat": 1 if ASR_WORD_TIMING else 0,  # 1: 附带词级时间戳 ResultDetail
+            "SourceType": 1,
+            "Data": base64.b64encode(audio_data).decode(),
+            "DataLen": len(audio_data)
+        }
+        if ASR_CALLBACK_URL:
+            params["CallbackUrl"] = ASR_CALLBACK_URL
+        req.from_json_string(json.dumps(params))
         
-        for attempt in range(max_attempts):
-            try:
-                print(f"查询任务状态... ({attempt + 1}/{max_attempts})")
+        print("发送腾讯云识别请求...")
+        # 通过共享客户端发送，限流、重试和熔断由客户端管理器处理
+        resp = self.asr_clients.call("CreateRecTask", req)
+        
+        if resp.Data and hasattr(resp.Data, 'TaskId'):
+            task_id = resp.Data.TaskId
+            print(f"腾讯云识别任务已创建，任务ID: {task_id}")
+            self.asr_clients.task_submitted(task_id)
+            
+            # 轮询获取结果
+            return self._poll_tencent_result(task_id, duration=duration)
+        else:
+            print(f"腾讯云API返回无效响应: {resp}")
+            raise Exception("腾讯云API返回无效响应")
+    
+    def _poll_tencent_result(self, task_id: int, duration: float = 50.0) -> List[Tuple[str, float, float]]:
+        """
+        等待腾讯云识别结果，duration 为本次请求音频的时长（秒）
+
+        配置了回调地址时等待回调推送，每 ASR_CALLBACK_POLL_INTERVAL 秒才查询一次状态作为兜底；
+        否则按随音频时长增大的间隔轮询。总等待时间上限为 ASR_POLL_TIMEOUT 加音频时长，
+        查询失败的重试和熔断由客户端管理器处理，这里不再重复重试
+        """
+        use_callback = bool(ASR_CALLBACK_URL)
+        print(f"开始等待腾讯云识别结果（{'回调' if use_callback else '轮询'}），任务ID: {task_id}")
+        
+        deadline = time.monotonic() + ASR_POLL_TIMEOUT + duration
+        # 识别通常远快于实时，长音频没有必要频繁查询
+        wait_time = min(max(1.0, duration / 60.0), 10.0)
+        attempt = 0
+        
+        try:
+            while time.monotonic() < deadline:
+                if use_callback:
+                    remaining = max(0.0, deadline - time.monotonic())
+                    completion = self.asr_callbacks.wait(task_id, min(ASR_CALLBACK_POLL_INTERVAL, remaining))
+                    if completion is not None:
+                        print("收到腾讯云识别回调")
+                        return self._task_result(completion.status, completion.result,
+                                                 completion.error_msg, duration, completion.result_detail)
+                
+                attempt += 1
                 
                 # 查询任务状态
                 req = models.DescribeTaskStatusRequest()
                 params = {"TaskId": task_id}
                 req.from_json_string(json.dumps(params))
                 
-                resp = client.DescribeTaskStatus(req)
+                resp = self.asr_clients.call("DescribeTaskStatus", req)
                 
-                if not resp.Data:
+                if resp.Data:
+                    status = resp.Data.Status
+                    print(f"任务状态: {status} (第 {attempt} 次查询)")
+                    result_detail = json.loads(resp.Data.to_json_string()).get('ResultDetail') if status == 2 else None
+                    results = self._task_result(status, getattr(resp.Data, 'Result', None),
+                                                getattr(resp.Data, 'ErrorMsg', None), duration, result_detail)
+                    if results is not None:
+                        return results
+                else:
                     print(f"腾讯云返回空响应: {resp}")
-                    asyncio.sleep(2)
-                    continue
                 
-                status = resp.Data.Status
-                print(f"任务状态: {status}")
-                
-                if status == 2:  # 成功
-                    print("腾讯云识别完成")
-                    
-                    # 检查结果
-                    if hasattr(resp.Data, 'Result') and resp.Data.Result:
-                        result_text = resp.Data.Result
-                        print(f"获得识别结果: {result_text[:200]}...")
-                        return self._parse_tencent_result(result_text)
-                    else:
-                        print("腾讯云识别完成但未返回结果")
-                        return [("（识别完成但无结果）", 0.0, actual_duration)]
-                        
-                elif status == 3:  # 失败
-                    error_msg = getattr(resp.Data, 'ErrorMsg', '未知错误')
-                    print(f"腾讯云识别失败: {error_msg}")
-                    raise Exception(f"腾讯云识别失败: {error_msg}")
-                    
-                elif status == 0:  # 等待中
-                    print("任务等待处理中...")
-                    
-                elif status == 1:  # 处理中
-                    print("任务正在处理中...")
-                    
-                elif status == 4:  # 超时
-                    print("腾讯云识别超时")
-                    raise Exception("腾讯云识别超时")
-                    
-                else:  # 其他状态
-                    print(f"未知任务状态: {status}")
-                
-                # 等待后继续查询
-                wait_time = min(2 + attempt * 0.5, 5)  # 逐渐增加等待时间，最多5秒
-                print(f"等待 {wait_time} 秒后重试...")
-                asyncio.sleep(wait_time)
-                    
-            except Exception as e:
-                print(f"查询识别结果失败: {e}")
-                import traceback
-                traceback.print_exc()
-                
-                # 如果是最后一次尝试，抛出异常
-                if attempt == max_attempts - 1:
-                    raise Exception(f"轮询识别结果失败: {e}")
-                
-                # 否则等待后继续
-                asyncio.sleep(2)
+                if not use_callback:
+                    # 等待后继续查询，间隔逐渐增加
+                    time.sleep(wait_time)
+                    wait_time = min(wait_time * 1.5, 10.0)
+        finally:
+            self.asr_callbacks.discard(task_id)
+            self.asr_clients.task_finished(task_id)
         
-        print(f"轮询超时，已尝试 {max_attempts} 次")
+        print(f"等待识别结果超时，已查询 {attempt} 次")
         raise Exception("腾讯云识别超时")
     
-    def _process_large_audio_tencent(self, audio_file_path: str) -> List[Tuple[str, float, float]]:
-        """分段处理大音频文件"""
+    def _task_result(self, status: int, result_text: str, error_msg: str, duration: float,
+                     result_detail: List[Dict] = None) -> Optional[List[Tuple[str, float, float]]]:
+        """按任务状态返回识别结果，任务仍在进行中时返回 None"""
+        if status == 2:  # 成功
+            print("腾讯云识别完成")
+            
+            # 优先使用逐句详细结果，带有每个词的时间戳
+            if result_detail:
+                sentences = self._parse_result_detail(result_detail)
+                if sentences:
+                    print(f"获得逐句识别结果: {len(sentences)} 句")
+                    return sentences
+            
+            # 检查结果
+            if result_text:
+                print(f"获得识别结果: {result_text[:200]}...")
+                return self._parse_tencent_result(result_text, duration)
+            print("腾讯云识别完成但未返回结果")
+            return [("（识别完成但无结果）", 0.0, duration)]
+        
+        if status == 3:  # 失败
+            error_msg = error_msg or '未知错误'
+            print(f"腾讯云识别失败: {error_msg}")
+            raise Exception(f"腾讯云识别失败: {error_msg}")
+        
+        if status == 4:  # 超时
+            print("腾讯云识别超时")
+            raise Exception("腾讯云识别超时")
+        
+        if status not in (0, 1):  # 0 等待中，1 处理中
+            print(f"未知任务状态: {status}")
+        return None
+    
+    def _process_large_audio_tencent(self, audio_file_path: str, audio: AudioSegment = None,
+                                     on_chunk: ChunkCallback = None) -> List[Tuple[str, float, float]]:
+        """分段处理大音频文件：每段按请求上限取最大时长，从 PCM 编码一次后直接发送"""
         try:
             print("开始分段处理大音频文件...")
             
             # 加载音频文件
-            audio = AudioSegment.from_wav(audio_file_path)
+            if audio is None:
+                audio = AudioSegment.from_wav(audio_file_path)
             total_duration_ms = len(audio)
             total_duration = total_duration_ms / 1000.0
             
             print(f"音频总时长: {total_duration:.2f} 秒")
             
-            # 将音频分成较小的段，每段约2分钟
-            chunk_length_ms = 120 * 1000  # 2分钟
+            # 每段时长由传输码率和请求上限决定，留10%余量给编码码率波动
+            chunk_length_ms = int(ASR_MAX_REQUEST_BYTES * 0.9 / self._transport_bytes_per_second() * 1000)
+            chunk_length_ms = min(chunk_length_ms, ASR_MAX_CHUNK_SECONDS * 1000)
             overlap_ms = 2000  # 2秒重叠，避免在句中分割
+            print(f"每段时长: {chunk_length_ms / 1000.0:.0f} 秒")
             
             segments = []
-            current_time = 0.0
+            last_end = 0.0
+            chunk_index = 0
             
             for i in range(0, total_duration_ms, chunk_length_ms - overlap_ms):
                 end_time = min(i + chunk_length_ms, total_duration_ms)
+                chunk_index += 1
                 
                 # 提取音频段
                 chunk = audio[i:end_time]
+                chunk_offset = i / 1000.0
                 
-                # 保存临时音频文件
-                temp_chunk_path = os.path.join(self.temp_dir, f"chunk_{uuid.uuid4()}.wav")
-                chunk.export(temp_chunk_path, format="wav")
-                
-                print(f"处理第 {len(segments) + 1} 段: {i/1000.0:.1f}s - {end_time/1000.0:.1f}s")
+                print(f"处理第 {chunk_index} 段: {i/1000.0:.1f}s - {end_time/1000.0:.1f}s")
                 
-                # 处理这一段
                 try:
-                    # 使用现有的识别方法处理这段音频
-                    chunk_results = self.recognize_speech_tencent(temp_chunk_path)
-                    
-                    # 调整时间戳
-                    for text, start, end in chunk_results:
-                        adjusted_start = current_time + start
-                        adjusted_end = current_time + end
-                        segments.append((text, adjusted_start, adjusted_end))
-                    
-                    current_time += (end_time - i) / 1000.0
-                    
+                    chunk_results = self._recognize_tencent_data(
+                        self._encode_for_transport(chunk), len(chunk) / 1000.0
+                    )
                 except Exception as e:
-                    print(f"处理第 {len(segments) + 1} 段时出错: {e}")
-                    # 如果某段处理失败，跳过并继续
-                    current_time += (end_time - i) / 1000.0
-                    continue
+                    print(f"处理第 {chunk_index} 段时出错，使用本地识别: {e}")
+                    chunk_results = self._recognize_chunk_locally(chunk)
                 
-                finally:
-                    # 清理临时文件
-                    if os.path.exists(temp_chunk_path):
-                        os.remove(temp_chunk_path)
+                # 调整时间戳，跳过重叠区域中已由上一段识别过的句子
+                new_segments = []
+                for result in chunk_results:
+                    adjusted = shift_result(result, chunk_offset)
+                    if (segments or new_segments) and adjusted[1] < last_end:
+                        continue
+                    new_segments.append(adjusted)
+                    last_end = adjusted[2]
+                
+                segments.extend(new_segments)
+                if on_chunk and new_segments:
+                    on_chunk(new_segments)
+                
+                if end_time >= total_duration_ms:
+                    break
             
             print(f"分段处理完成，共处理 {len(segments)} 个片段")
             return segments
@@ -334,23 +554,69 @@ class VideoProcessor:
             import traceback
             traceback.print_exc()
             # 如果分段处理失败，回退到本地识别
-            return self._fallback_local_recognition(audio_file_path)
+            return self._fallback_recognize(audio_file_path)
     
-    def _parse_tencent_result(self, result_text: str) -> List[Tuple[str, float, float]]:
-        """解析腾讯云识别结果"""
+    def _recognize_chunk_locally(self, chunk: AudioSegment) -> List[Tuple[str, float, float]]:
+        """
+        单段腾讯云识别失败时走本地识别
+
+        备选为 SpeechRecognition 时直接在内存中识别；其他提供者需要文件路径，写出临时文件
+        """
+        provider = self.fallback_provider
+        if provider.name in ('tencent', 'speech_recognition') or not provider.available():
+            try:
+                import speech_recognition as sr
+                audio_data = sr.AudioData(chunk.raw_data, chunk.frame_rate, chunk.sample_width)
+                results = self._recognize_audio_data_parallel(audio_data)
+            except Exception as e:
+                print(f"本地识别片段失败: {e}")
+                results = []
+            return results or [("（无法识别音频内容）", 0.0, len(chunk) / 1000.0)]
+        
+        temp_chunk_path = os.path.join(self.temp_dir, f"chunk_{uuid.uuid4()}.wav")
         try:
-            print(f"开始解析腾讯云识别结果: {result_text[:200]}...")
-            
-            # 获取音频文件的实际时长
-            actual_duration = 50.0  # 默认值
-            actual_duration_ms = 50000  # 默认值
+            chunk.export(temp_chunk_path, format="wav")
+            return self._fallback_recognize(temp_chunk_path)
+        finally:
+            if os.path.exists(temp_chunk_path):
+                os.remove(temp_chunk_path)
+    
+    @staticmethod
+    def _parse_result_detail(result_detail: List[Dict]) -> List[TimedText]:
+        """解析 ResultDetail（SentenceDetail 列表），词的时间是相对句子开始的偏移"""
+        sentences = []
+        for sentence in result_detail:
+            text = (sentence.get('FinalSentence') or '').strip()
+            if not text:
+                continue
+            start = (sentence.get('StartMs') or 0) / 1000.0
+            end = (sentence.get('EndMs') or 0) / 1000.0
+            words = [
+                (word['Word'], start + (word.get('OffsetStartMs') or 0) / 1000.0,
+                 start + (word.get('OffsetEndMs') or 0) / 1000.0)
+                for word in sentence.get('Words') or []
+                if word.get('Word')
+            ]
+            sentences.append(TimedText(text, start, end, words))
+        return sentences
+    
+    def _parse_tencent_result(self, result_text: str, duration: float = None) -> List[Tuple[str, float, float]]:
+        """解析腾讯云识别结果，duration 为本次请求音频的时长（秒）"""
+        # 获取音频的实际时长
+        actual_duration = 50.0  # 默认值
+        if duration is not None:
+            actual_duration = duration
+        else:
             try:
                 audio = AudioSegment.from_wav(self.current_audio_file)
-                actual_duration_ms = len(audio)
-                actual_duration = actual_duration_ms / 1000.0
+                actual_duration = len(audio) / 1000.0
                 print(f"音频实际时长: {actual_duration}秒")
             except Exception as e:
                 print(f"获取音频时长失败: {e}")
+        actual_duration_ms = actual_duration * 1000
+        
+        try:
+            print(f"开始解析腾讯云识别结果: {result_text[:200]}...")
             
             # 如果结果是空字符串
             if not result_text or result_text.strip() == "":
@@ -372,13 +638,8 @@ class VideoProcessor:
                 elif 'result' in result_data:
                     result_content = result_data.get('result', '')
                     if result_content:
-                        # 获取音频文件的实际时长来设置时间戳
-                        try:
-                            audio = AudioSegment.from_wav(self.current_audio_file)
-                            actual_duration_ms = len(audio)
-                            sentences = [{'text': result_content, 'start_time': 0, 'end_time': actual_duration_ms}]
-                        except:
-                            sentences = [{'text': result_content, 'start_time': 0, 'end_time': 50000}]
+                        # 使用音频的实际时长来设置时间戳
+                        sentences = [{'text': result_content, 'start_time': 0, 'end_time': actual_duration_ms}]
             except json.JSONDecodeError:
                 # 如果不是JSON格式，尝试解析纯文本格式 [start:end] text
                 print(f"结果不是JSON格式，尝试解析纯文本格式")
@@ -386,11 +647,10 @@ class VideoProcessor:
                 
                 # 使用正则表达式匹配 [start:end] text 格式
                 import re
-                # 腾讯云格式: [0:0.000,0:50.340] text
+                # 腾讯云格式: 每行一句 [0:0.000,0:50.340] text
                 pattern = r'\[(\d+):(\d+(?:\.\d+)?),(\d+):(\d+(?:\.\d+)?)\]\s*(.+)'
-                match = re.search(pattern, result_text)
                 
-                if match:
+                for match in re.finditer(pattern, result_text):
                     start_minutes = int(match.group(1))
                     start_seconds = float(match.group(2))
                     end_minutes = int(match.group(3))
@@ -403,16 +663,12 @@ class VideoProcessor:
                     
                     print(f"解析到时间戳: {start_time}s - {end_time}s, 文本: {text_content[:50]}...")
                     
-                    sentences = [{'text': text_content, 'start_time': start_time * 1000, 'end_time': end_time * 1000}]
-                else:
+                    sentences.append({'text': text_content, 'start_time': start_time * 1000, 'end_time': end_time * 1000})
+                
+                if not sentences:
                     # 如果格式不匹配，使用整个文本作为结果
                     print(f"无法解析时间戳格式，使用整个文本: {result_text[:100]}...")
-                    try:
-                        audio = AudioSegment.from_wav(self.current_audio_file)
-                        actual_duration_ms = len(audio)
-                        sentences = [{'text': result_text.strip(), 'start_time': 0, 'end_time': actual_duration_ms}]
-                    except:
-                        sentences = [{'text': result_text.strip(), 'start_time': 0, 'end_time': 50000}]
+                    sentences = [{'text': result_text.strip(), 'start_time': 0, 'end_time': actual_duration_ms}]
             
             # 处理解析后的句子数据
             result_segments = []
@@ -448,12 +704,7 @@ class VideoProcessor:
             traceback.print_exc()
             
             # 出错时返回默认结果，使用实际音频时长
-            try:
-                audio = AudioSegment.from_wav(self.current_audio_file)
-                actual_duration = len(audio) / 1000.0
-                return [("（识别结果解析出错）", 0.0, actual_duration)]
-            except:
-                return [("（识别结果解析出错）", 0.0, 50.0)]
+            return [("（识别结果解析出错）", 0.0, actual_duration)]
     
     def _recognize_large_audio(self, audio_file_path: str) -> List[Tuple[str, float, float]]:
         """处理大音频文件（分割后识别）"""
@@ -530,8 +781,9 @@ class VideoProcessor:
             traceback.print_exc()
             return [("（大音频文件处理失败）", 0.0, 10.0)]
     
-    def _fallback_local_recognition(self, audio_file_path: str) -> List[Tuple[str, float, float]]:
-        """回退到本地识别"""
+    def _fallback_local_recognition(self, audio_file_path: str,
+                                    on_chunk: ChunkCallback = None) -> List[Tuple[str, float, float]]:
+        """回退到本地识别，大文件分段识别时每段完成调用 on_chunk"""
         print("回退到本地语音识别...")
         try:
             import speech_recognition as sr
@@ -543,7 +795,7 @@ class VideoProcessor:
             # 如果文件太大，需要分割处理
             if file_size > 5 * 1024 * 1024:  # 5MB
                 print("音频文件较大，使用分段识别...")
-                return self._local_recognize_with_chunks(audio_file_path)
+                return self._local_recognize_with_chunks(audio_file_path, on_chunk)
             
             recognizer = sr.Recognizer()
             
@@ -579,51 +831,24 @@ class VideoProcessor:
             traceback.print_exc()
             return [("（语音识别完全失败）", 0.0, 10.0)]
     
-    def _local_recognize_with_chunks(self, audio_file_path: str) -> List[Tuple[str, float, float]]:
-        """分段本地识别"""
+    def _local_recognize_with_chunks(self, audio_file_path: str,
+                                     on_chunk: ChunkCallback = None) -> List[Tuple[str, float, float]]:
+        """分段本地识别：整段音频只读取一次，噪音校准一次，切片在内存中并行识别"""
         try:
             import speech_recognition as sr
             
-            audio = AudioSegment.from_wav(audio_file_path)
-            chunk_length_ms = 10000  # 10秒一段
-            chunks = []
-            
-            # 分割音频
-            for i in range(0, len(audio), chunk_length_ms):
-                chunk = audio[i:i + chunk_length_ms]
-                chunk_file = os.path.join(self.temp_dir, f"local_chunk_{uuid.uuid4()}.wav")
-                chunk.export(chunk_file, format="wav")
-                chunks.append((chunk_file, i / 1000.0))
-            
-            # 逐个识别
-            all_results = []
             recognizer = sr.Recognizer()
             recognizer.energy_threshold = 300
             recognizer.dynamic_energy_threshold = True
             
-            for chunk_file, start_time in chunks:
-                try:
-                    with sr.AudioFile(chunk_file) as source:
-                        recognizer.adjust_for_ambient_noise(source, duration=0.3)
-                        audio_data = recognizer.record(source)
-                        text = recognizer.recognize_google(audio_data, language="zh-CN")
-                        
-                        if text.strip():
-                            # 估算当前片段的时长
-                            chunk_duration = len(audio_data.frame_data) / (audio_data.sample_rate * audio_data.sample_width)
-                            all_results.append((text, start_time, start_time + chunk_duration))
-                            
-                except sr.UnknownValueError:
-                    # 跳过无法识别的片段
-                    pass
-                except Exception as e:
-                    print(f"本地识别片段失败: {e}")
-                finally:
-                    if os.path.exists(chunk_file):
-                        try:
-                            os.remove(chunk_file)
-                        except:
-                            pass
+            # 噪音校准只在文件开头做一次，结果共享给所有识别线程
+            with sr.AudioFile(audio_file_path) as source:
+                recognizer.adjust_for_ambient_noise(source, duration=0.5)
+            with sr.AudioFile(audio_file_path) as source:
+                audio_data = recognizer.record(source)
+            
+            all_results = self._recognize_audio_data_parallel(audio_data, recognizer.energy_threshold,
+                                                              on_chunk=on_chunk)
             
             if not all_results:
                 return [("（所有片段都无法识别）", 0.0, 10.0)]
@@ -634,15 +859,157 @@ class VideoProcessor:
             print(f"分段本地识别失败: {e}")
             return [("（分段识别失败）", 0.0, 10.0)]
     
-    async def transcribe_audio(self, audio_path: str) -> List[Tuple[str, float, float]]:
-        """语音识别转文本 - 使用腾讯云API"""
-        print("开始腾讯云语音识别（普通话）...")
-        results = self.recognize_speech_tencent(audio_path)
+    def _recognize_audio_data_parallel(self, audio_data, energy_threshold: float = 300,
+                                       chunk_length_ms: int = 10000,
+                                       on_chunk: ChunkCallback = None) -> List[Tuple[str, float, float]]:
+        """
+        将内存中的 AudioData 按 chunk_length_ms 切片，由有界线程池并行识别
+
+        每个线程持有自己的 Recognizer，结果按时间顺序返回并依次传给 on_chunk
+        """
+        import speech_recognition as sr
+        
+        bytes_per_second = audio_data.sample_rate * audio_data.sample_width
+        total_ms = len(audio_data.frame_data) * 1000 // bytes_per_second
+        chunk_starts = list(range(0, total_ms, chunk_length_ms))
+        local = threading.local()
+        
+        def recognize(start_ms: int):
+            recognizer = getattr(local, "recognizer", None)
+            if recognizer is None:
+                recognizer = sr.Recognizer()
+                recognizer.energy_threshold = energy_threshold
+                local.recognizer = recognizer
+            
+            chunk = audio_data.get_segment(start_ms, start_ms + chunk_length_ms)
+            try:
+                text = recognizer.recognize_google(chunk, language="zh-CN")
+            except sr.UnknownValueError:
+                # 跳过无法识别的片段
+                return None
+            except Exception as e:
+                print(f"本地识别片段失败: {e}")
+                return None
+            
+            if not text.strip():
+                return None
+            start_time = start_ms / 1000.0
+            chunk_duration = len(chunk.frame_data) / bytes_per_second
+            return (text, start_time, start_time + chunk_duration)
+        
+        print(f"本地分段识别: {len(chunk_starts)} 段，{LOCAL_RECOGNITION_WORKERS} 个线程")
+        results = []
+        with ThreadPoolExecutor(max_workers=LOCAL_RECOGNITION_WORKERS) as executor:
+            for result in executor.map(recognize, chunk_starts):
+                if result:
+                    results.append(result)
+                    if on_chunk:
+                        on_chunk([result])
+        return results
+    
+    def get_media_info(self, video_id: str, video_path: str = None) -> MediaInfo:
+        """获取视频的媒体信息，首次调用时探测并保存到 Video 记录"""
+        video = Database.get_video(video_id)
+        if video and video.media_info is not None:
+            return video.media_info
+        
+        media_info = probe_media(video_path or video.file_path)
+        print(f"媒体信息: {media_info.format_name}, 时长 {media_info.duration:.2f} 秒, "
+              f"视频 {media_info.video_codec} {media_info.width}x{media_info.height}@{media_info.frame_rate:.2f}, "
+              f"音频 {media_info.audio_codec} {media_info.sample_rate}Hz/{media_info.channels}ch")
+        if video:
+            video.media_info = media_info
+            video.duration = media_info.duration
+        return media_info
+    
+    def _fallback_recognize(self, audio_file_path: str) -> List[Tuple[str, float, float]]:
+        """主识别失败时使用备选提供者"""
+        provider = self.fallback_provider
+        if provider.name == 'tencent' or not provider.available():
+            return self._fallback_local_recognition(audio_file_path)
+        print(f"回退到备选识别提供者: {provider.name}")
+        return provider.recognize(audio_file_path)
+    
+    async def transcribe_audio(self, audio_path: str, on_chunk: ChunkCallback = None) -> List[Tuple[str, float, float]]:
+        """
+        语音识别转文本 - 使用配置的识别提供者，在线程池中运行避免阻塞事件循环
+
+        on_chunk 在事件循环中按块依次调用；主提供者出错时改用备选提供者重新识别，
+        与已发布片段重叠的结果由 TranscriptStream 跳过
+        """
+        provider = self.asr_provider
+        if not provider.available():
+            print(f"识别提供者 {provider.name} 不可用，使用备选 {self.fallback_provider.name}")
+            provider = self.fallback_provider
+        
+        print(f"开始语音识别（{provider.name}）...")
+        loop = asyncio.get_running_loop()
+        chunk_callback = None
+        if on_chunk:
+            # 识别在工作线程中进行，结果交回事件循环再写入转录
+            chunk_callback = lambda chunk: loop.call_soon_threadsafe(on_chunk, chunk)
+        try:
+            results = await loop.run_in_executor(None, provider.recognize, audio_path, chunk_callback)
+        except Exception as e:
+            fallback = self.fallback_provider
+            if fallback.name == provider.name or not fallback.available():
+                raise
+            print(f"识别提供者 {provider.name} 失败: {e}，改用备选 {fallback.name}")
+            results = await loop.run_in_executor(None, fallback.recognize, audio_path, chunk_callback)
         print(f"语音识别完成，获得 {len(results)} 个片段")
         return results
     
-    async def process_video(self, video_id: str, video_path: str):
-        """处理视频：提取音频 -> 转录 -> 生成片段"""
+    def restore_job(self, record: JobRecord) -> Optional[Video]:
+        """按检查点重建上次未完成任务的视频记录，原始上传已不存在时放弃该任务"""
+        if not os.path.exists(record.file_path):
+            print(f"恢复任务失败，原始文件已不存在: {record.file_path}")
+            self.jobs.finish(record.video_id)
+            return None
+        
+        video = Video(
+            id=record.video_id,
+            filename=record.filename,
+            file_path=record.file_path,
+            size=record.size,
+            upload_time=record.upload_time
+        )
+        # 已生成的代理文件直接沿用，这样提取阶段可以命中音频缓存
+        proxy_path = os.path.join(self.temp_dir, f"proxy_{record.video_id}.mp4")
+        if os.path.exists(proxy_path) and os.path.getsize(proxy_path) > 0:
+            video.proxy_path = proxy_path
+            self.storage.register(proxy_path, record.video_id, "proxy")
+        Database.add_video(video)
+        self.storage.register(record.file_path, record.video_id, "upload")
+        print(f"恢复未完成的任务 {record.video_id}（阶段 {record.stage}）")
+        return video
+    
+    async def _transcribe_from(self, audio_path: str, offset: float, duration: float,
+                               on_chunk: ChunkCallback) -> List[Tuple[str, float, float]]:
+        """只识别 offset 秒之后的音频（从检查点恢复时），结果平移回原视频时间轴"""
+        if duration > 0 and offset >= duration - 0.5:
+            return []
+        loop = asyncio.get_running_loop()
+        # 时长未知时解码到文件末尾，不能按猜测的长度截断
+        span_path = await loop.run_in_executor(None, self._extract_audio_span, audio_path, offset,
+                                               duration if duration > 0 else None)
+        try:
+            results = await self.transcribe_audio(
+                span_path, on_chunk=lambda chunk: on_chunk([shift_result(r, offset) for r in chunk])
+            )
+        finally:
+            if os.path.exists(span_path):
+                os.remove(span_path)
+        return [shift_result(r, offset) for r in results]
+    
+    async def process_video(self, video_id: str, video_path: str, resume: bool = False):
+        """
+        处理视频：提取音频 -> 转录 -> 生成片段
+
+        resume 为 True 时先恢复检查点中已识别的块，只识别剩余部分
+        """
+        # 处理期间该视频的产物不参与淘汰
+        self.storage.acquire(video_id)
+        stream = None
         try:
             print(f"开始处理视频 {video_id}")
             print(f"视频文件路径: {video_path}")
@@ -664,14 +1031,74 @@ class VideoProcessor:
             
             print(f"视频文件大小: {file_size / (1024*1024):.2f} MB")
             
+            if task:
+                task.progress = 8
+                task.message = "正在读取媒体信息..."
+            
+            # 0. 探测媒体信息（每次上传只运行一次，结果保存在 Video 记录上）
+            media_info = self.get_media_info(video_id, video_path)
+            
             if task:
                 task.progress = 10
                 task.message = "正在提取音频..."
+            self.jobs.set_stage(video_id, STAGE_EXTRACTING)
+            
+            # 1. 提取音频（同一次解码生成用于拖动预览的代理文件）
+            if is_asr_ready_wav(video_path):
+                # 浏览器插件和 audio_converter.py 已经生成了16kHz单声道PCM，直接用于识别
+                print("上传文件已是识别所需的16kHz单声道PCM WAV，跳过音频提取")
+                audio_path = video_path
+                video = Database.get_video(video_id)
+                if video:
+                    # 文件本身足够小，直接作为代理供前端播放
+                    video.proxy_path = video_path
+            else:
+                proxy_path = os.path.join(self.temp_dir, f"proxy_{video_id}.mp4") if PROXY_HEIGHT > 0 else None
+                video = Database.get_video(video_id)
+                has_proxy = bool(video and video.proxy_path and os.path.exists(video.proxy_path))
+                
+                # 重新处理时复用已提取的音频；代理文件也需要重新生成时仍走同一次解码
+                audio_path = self.audio_cache.get(video_path, video_id) if (has_proxy or not proxy_path) else None
+                if not audio_path:
+                    print(f"开始提取视频 {video_id} 的音频...")
+                    audio_path = await self.extract_audio(video_path, proxy_path, media_info)
+                    print(f"音频提取完成: {audio_path}")
+                    
+                    # 完整提取的音频放入缓存，供重新处理和局部重新识别复用
+                    if self._is_complete_extraction(audio_path, media_info):
+                        audio_path = self.audio_cache.put(video_path, audio_path, video_id)
+                    
+                    if proxy_path and os.path.exists(proxy_path) and os.path.getsize(proxy_path) > 0:
+                        if video:
+                            video.proxy_path = proxy_path
+                        self.storage.register(proxy_path, video_id, "proxy")
+                        print(f"代理文件生成完成: {proxy_path}")
+            
+            # 探测关键帧索引，供导出切分和拖动定位复用
+            video = Database.get_video(video_id)
+            if video and media_info.has_video and video.keyframe_index is None:
+                try:
+                    loop = asyncio.get_running_loop()
+                    keyframe_index = await loop.run_in_executor(None, KeyframeIndex.build, video_path)
+                    if len(keyframe_index) > 0:
+                        video.keyframe_index = keyframe_index
+                        print(f"关键帧索引完成: {len(keyframe_index)} 个关键帧，{keyframe_index.packet_count} 个数据包")
+                except Exception as e:
+                    print(f"关键帧索引失败: {e}")
             
-            # 1. 提取音频
-            print(f"开始提取视频 {video_id} 的音频...")
-            audio_path = await self.extract_audio(video_path)
-            print(f"音频提取完成: {audio_path}")
+            # 从识别用的16kHz PCM计算波形峰值金字塔
+            try:
+                loop = asyncio.get_running_loop()
+                waveform_path = await loop.run_in_executor(
+                    None, build_peak_pyramid, audio_path, os.path.join(self.temp_dir, f"peaks_{video_id}.bin")
+                )
+                video = Database.get_video(video_id)
+                if video:
+                    video.waveform_path = waveform_path
+                self.storage.register(waveform_path, video_id, "waveform")
+                print(f"波形峰值生成完成: {waveform_path}")
+            except Exception as e:
+                print(f"波形峰值生成失败: {e}")
             
             if task:
                 task.progress = 30
@@ -687,51 +1114,50 @@ class VideoProcessor:
             except Exception as e:
                 print(f"获取音频时长失败: {e}")
             
-            # 2. 语音识别
+            # 2. 语音识别，每完成一块音频就把片段追加到转录，前端可以先编辑已识别的部分
             print("开始语音识别...")
-            transcripts = await self.transcribe_audio(audio_path)
-            print(f"语音识别完成，获得 {len(transcripts)} 个片段")
+            video = Database.get_video(video_id)
+            if video:
+                video.transcript_complete = False
+            Database.add_transcript(video_id, [])
+            stream = TranscriptStream(video_id, actual_duration, task,
+                                      checkpoint=lambda results: self.jobs.add_chunk(video_id, results))
+            resume_at = 0.0
+            if resume:
+                # 重新发布已检查点的块，得到与重启前相同的片段
+                for results in self.jobs.chunks(video_id):
+                    stream.publish(results, checkpoint=False)
+                resume_at = stream.last_end
+                if stream.count:
+                    print(f"从检查点恢复 {stream.count} 个片段，从 {resume_at:.1f}s 继续识别")
+            else:
+                self.jobs.clear_chunks(video_id)
+            self.jobs.set_stage(video_id, STAGE_TRANSCRIBING)
             
-            if not transcripts:
-                print("警告：没有获得任何识别结果")
-                # 创建一个默认的空片段
-                transcripts = [("（无识别结果）", 0.0, actual_duration)]
+            if resume_at > 0:
+                transcripts = await self._transcribe_from(audio_path, resume_at, actual_duration, stream.publish)
+            else:
+                transcripts = await self.transcribe_audio(audio_path, on_chunk=stream.publish)
+            print(f"语音识别完成，获得 {len(transcripts)} 个片段")
             
             if task:
-                task.progress = 70
+                task.progress = 90
                 task.message = "正在生成文本片段..."
             
-            # 3. 生成转录片段
-            segments = []
-            for i, (text, start_time, end_time) in enumerate(transcripts):
-                # 验证时间戳
-                if start_time < 0:
-                    start_time = 0.0
-                if end_time <= start_time:
-                    end_time = start_time + 1.0
-                
-                # 清理文本
-                cleaned_text = text.strip()
-                if not cleaned_text:
-                    cleaned_text = "（无文本内容）"
-                
-                segment = TranscriptSegment(
-                    id=f"seg_{video_id}_{i}",
-                    video_id=video_id,
-                    text=cleaned_text,
-                    start_time=start_time,
-                    end_time=end_time,
-                    order=i
-                )
-                segments.append(segment)
-                print(f"片段 {i+1}: {start_time:.1f}s - {end_time:.1f}s, 文本: {cleaned_text[:50]}...")
+            # 3. 补充未逐块发布的结果（单次请求识别或整段回退识别）
+            stream.publish(transcripts)
+            
+            if stream.count == 0:
+                print("警告：没有获得任何识别结果")
+                # 创建一个默认的空片段
+                stream.publish([("（无识别结果）", 0.0, actual_duration)])
             
-            # 保存到数据库
-            print(f"保存 {len(segments)} 个片段到数据库")
-            Database.add_transcript(video_id, segments)
+            print(f"转录共 {stream.count} 个片段")
+            if video:
+                video.transcript_complete = True
             
-            # 清理临时音频文件
-            if os.path.exists(audio_path):
+            # 清理临时音频文件（上传文件本身和缓存中的音频不删除）
+            if audio_path != video_path and not self.audio_cache.contains(audio_path) and os.path.exists(audio_path):
                 try:
                     os.remove(audio_path)
                     print("临时音频文件已清理")
@@ -741,10 +1167,19 @@ class VideoProcessor:
             if task:
                 task.status = "completed"
                 task.progress = 100
-                task.message = f"处理完成，共生成 {len(segments)} 个片段"
+                task.message = f"处理完成，共生成 {stream.count} 个片段"
+            self.jobs.finish(video_id)
+            
+            # 后台生成片段缩略图，不阻塞转录完成
+            asyncio.create_task(self.update_thumbnails(video_id))
                 
             print(f"视频 {video_id} 处理完成")
                 
+        except asyncio.CancelledError:
+            # 识别线程无法中断，之后交回的块不能再写入（检查点可能已属于接管任务的其他 worker）
+            if stream is not None:
+                stream.close()
+            raise
         except Exception as e:
             print(f"视频处理失败: {e}")
             import traceback
@@ -755,8 +1190,15 @@ class VideoProcessor:
                 task.status = "failed"
                 task.progress = 0
                 task.message = f"处理失败: {str(e)}"
+            self.jobs.finish(video_id)
+            
+            video = Database.get_video(video_id)
+            if video:
+                video.transcript_complete = True
             
-            # 确保至少有一个默认片段
+            # 已逐块生成的片段保留，没有任何片段时创建一个默认片段
+            if Database.get_transcript(video_id):
+                return
             try:
                 default_segments = [
                     TranscriptSegment(
@@ -772,6 +1214,134 @@ class VideoProcessor:
                 print("已创建默认片段")
             except Exception as db_e:
                 print(f"创建默认片段失败: {db_e}")
+        finally:
+            self.storage.release(video_id)
+    
+    def thumbnail_sprites(self, video_id: str) -> ThumbnailSprites:
+        """视频的缩略图雪碧图缓存，同一视频总是返回同一个实例"""
+        sprites = self._thumbnail_sprites.get(video_id)
+        if sprites is None:
+            sprites = self._thumbnail_sprites[video_id] = ThumbnailSprites(
+                os.path.join(self.temp_dir, f"thumbs_{video_id}"))
+        return sprites
+    
+    async def update_thumbnails(self, video_id: str):
+        """为当前所有片段补齐缩略图（已缓存的时间点不会重新提取）"""
+        try:
+            video = Database.get_video(video_id)
+            if not video or not os.path.exists(video.file_path):
+                return
+            
+            if not self.get_media_info(video_id).has_video:
+                return
+            
+            sprites = self.thumbnail_sprites(video_id)
+            segments = list(Database.get_transcript(video_id))
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, sprites.update, video.file_path, segments)
+            self.storage.register(sprites.cache_dir, video_id, "thumbnails")
+        except Exception as e:
+            print(f"缩略图生成失败: {e}")
+    
+    def _extract_audio_span(self, source_path: str, start: float, end: Optional[float]) -> str:
+        """
+        只解码 [start, end) 秒的音频，输出识别所需的16kHz单声道WAV（源可以是缓存的PCM）
+
+        end 为 None 时解码到文件末尾，按源文件大小预留空间
+        """
+        span_path = os.path.join(self.temp_dir, f"chunk_{uuid.uuid4()}.wav")
+        if end is None:
+            self.storage.ensure_capacity(os.path.getsize(source_path))
+            input_args = {"ss": start}
+        else:
+            self.storage.ensure_capacity(int((end - start) * 32000))
+            input_args = {"ss": start, "t": end - start}
+        (
+            ffmpeg
+            .input(source_path, **input_args)['a:0']
+            .output(span_path, acodec='pcm_s16le', ac=1, ar='16000')
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True, quiet=True)
+        )
+        return span_path
+    
+    async def retranscribe_range(self, video_id: str, start: float = None, end: float = None,
+                                 segment_ids: List[str] = None) -> Tuple[List[str], List[TranscriptSegment]]:
+        """
+        只重新识别一段时间范围，并用结果替换该范围内的片段
+
+        指定 segment_ids 时替换这些片段，范围为它们覆盖的时间；否则替换与 [start, end)
+        重叠的片段，范围扩展到这些片段的边界。其余片段（包括用户的编辑）保持不变。
+        返回 (被替换的片段ID, 新片段)
+        """
+        video = Database.get_video(video_id)
+        transcript = Database.get_transcript(video_id)
+        
+        if segment_ids:
+            wanted = set(segment_ids)
+            targets = [seg for seg in transcript if seg.id in wanted]
+            if not targets:
+                raise ValueError("未找到指定的片段")
+            start = min(seg.start_time for seg in targets)
+            end = max(seg.end_time for seg in targets)
+        else:
+            if start is None or end is None or end <= start:
+                raise ValueError("时间范围无效")
+            targets = [seg for seg in transcript if seg.start_time < end and seg.end_time > start]
+            if targets:
+                start = min(start, min(seg.start_time for seg in targets))
+                end = max(end, max(seg.end_time for seg in targets))
+        
+        start = max(0.0, start)
+        if video.duration > 0:
+            end = min(end, video.duration)
+        if end <= start:
+            raise ValueError("时间范围超出视频时长")
+        
+        print(f"局部重新识别 {video_id}: {start:.2f}s - {end:.2f}s，替换 {len(targets)} 个片段")
+        
+        self.storage.acquire(video_id)
+        span_path = None
+        try:
+            loop = asyncio.get_running_loop()
+            # 优先从缓存的16kHz PCM切片，避免重新解码原视频
+            if is_asr_ready_wav(video.file_path):
+                source_path = video.file_path
+            else:
+                source_path = self.audio_cache.get(video.file_path, video_id) or video.file_path
+            span_path = await loop.run_in_executor(None, self._extract_audio_span, source_path, start, end)
+            results = await self.transcribe_audio(span_path)
+        finally:
+            if span_path and os.path.exists(span_path):
+                os.remove(span_path)
+            self.storage.release(video_id)
+        
+        # 识别结果是相对时间，平移到原视频时间轴并限制在范围内
+        next_index = Database.next_segment_index(video_id)
+        new_segments = []
+        for result in results:
+            result = shift_result(result, start)
+            text, seg_start, seg_end = result
+            seg_start = min(max(seg_start, start), end)
+            seg_end = min(max(seg_end, seg_start), end)
+            cleaned_text = text.strip()
+            if not cleaned_text or seg_end <= seg_start:
+                continue
+            segment_id = f"seg_{video_id}_{next_index + len(new_segments)}"
+            Database.set_word_timing(video_id, segment_id, WordTimingIndex.from_words(cleaned_text, words_of(result)))
+            new_segments.append(TranscriptSegment(
+                id=segment_id,
+                video_id=video_id,
+                text=cleaned_text,
+                start_time=seg_start,
+                end_time=seg_end,
+                order=0
+            ))
+        
+        removed_ids = [seg.id for seg in targets]
+        Database.replace_segments(video_id, removed_ids, new_segments)
+        print(f"局部重新识别完成，生成 {len(new_segments)} 个新片段")
+        return removed_ids, new_segments
     
     async def split_video_segment(self, video_id: str, segment_id: str, split_points: List[float], new_text: str = None) -> List[TranscriptSegment]:
         """分割视频片段"""
@@ -805,15 +1375,34 @@ class VideoProcessor:
             return self._split_segment_by_time(video_id, target_segment, target_index, split_points)
     
     def _split_segment_by_text(self, video_id: str, target_segment, target_index: int, new_text: str) -> List[TranscriptSegment]:
-        """按文本内容分割片段（基于'---'分隔符）"""
-        # 按'---'分割文本
-        text_parts = [part.strip() for part in new_text.split('---') if part.strip()]
+        """
+        按文本内容分割片段（基于'---'分隔符）
+
+        有词级时间戳时切点取分隔符两侧词之间的时间，否则按字符数比例分配
+        """
+        # 按'---'分割文本，记录每个非空部分在去掉分隔符后的文本中的字符范围
+        raw_parts = new_text.split('---')
+        joined_length = sum(len(part) for part in raw_parts)
+        text_parts = []
+        char_ranges = []
+        offset = 0
+        for part in raw_parts:
+            if part.strip():
+                leading = len(part) - len(part.lstrip())
+                text_parts.append(part.strip())
+                char_ranges.append((offset + leading, offset + len(part)))
+            offset += len(part)
         
         if len(text_parts) <= 1:
             return [target_segment]
         
         print(f"文本分割为 {len(text_parts)} 个部分: {text_parts}")
         
+        word_timing = Database.get_word_timing(video_id, target_segment.id)
+        # 文本被编辑过时按长度比例把字符位置映射回原识别文本，此时不再保留词级时间
+        exact_text = ''.join(raw_parts) == target_segment.text
+        scale = 1.0 if exact_text or not joined_length else len(target_segment.text) / joined_length
+        
         # 计算每个部分的时间长度（按字符数比例分配）
         total_chars = len(''.join(text_parts))
         duration = target_segment.end_time - target_segment.start_time
@@ -822,13 +1411,21 @@ class VideoProcessor:
         current_time = target_segment.start_time
         
         for i, text_part in enumerate(text_parts):
-            # 计算当前部分的时长
-            part_duration = (len(text_part) / total_chars) * duration if total_chars > 0 else duration / len(text_parts)
-            end_time = current_time + part_duration
-            
-            # 确保最后一个部分结束时间不超出原片段
+            part_timing = None
             if i == len(text_parts) - 1:
+                # 确保最后一个部分结束时间不超出原片段
                 end_time = target_segment.end_time
+            elif word_timing:
+                end_time = word_timing.time_at_char(char_ranges[i + 1][0] * scale)
+            else:
+                # 计算当前部分的时长
+                part_duration = (len(text_part) / total_chars) * duration if total_chars > 0 else duration / len(text_parts)
+                end_time = current_time + part_duration
+            end_time = min(max(end_time, current_time), target_segment.end_time)
+            
+            if word_timing and exact_text:
+                part_end = char_ranges[i + 1][0] if i + 1 < len(char_ranges) else word_timing.text_length
+                part_timing = word_timing.slice(char_ranges[i][0], part_end, rebase=char_ranges[i][0])
             
             new_segment = TranscriptSegment(
                 id=f"seg_{video_id}_{target_index}_{i}",
@@ -838,6 +1435,7 @@ class VideoProcessor:
                 end_time=end_time,
                 order=target_segment.order + i
             )
+            Database.set_word_timing(video_id, new_segment.id, part_timing)
             new_segments.append(new_segment)
             print(f"创建片段 {i}: {current_time:.2f}s - {end_time:.2f}s, 文本: {text_part[:30]}...")
             
@@ -846,45 +1444,57 @@ class VideoProcessor:
         return new_segments
     
     def _split_segment_by_time(self, video_id: str, target_segment, target_index: int, split_points: List[float]) -> List[TranscriptSegment]:
-        """按时间点分割片段"""
+        """
+        按时间点分割片段
+
+        有词级时间戳时文本在每个时间点之后开始的第一个词处切开，否则按字符数平均切分
+        """
         duration = target_segment.end_time - target_segment.start_time
         
         if len(split_points) == 0:
             return [target_segment]
         
+        word_timing = Database.get_word_timing(video_id, target_segment.id)
+        text = target_segment.text
+        boundaries = [0.0] + list(split_points) + [duration]
+        part_count = len(boundaries) - 1
+        
+        # 每个部分的文本字符范围
+        if word_timing:
+            cuts = [0] + [word_timing.cut_char(target_segment.start_time + point) for point in split_points] + [len(text)]
+            for i in range(1, len(cuts)):
+                cuts[i] = max(cuts[i], cuts[i - 1])
+        else:
+            cuts = [int(len(text) * (i / part_count)) for i in range(part_count + 1)]
+        
         # 创建分割后的片段
         new_segments = []
-        start_time = target_segment.start_time
-        
-        # 按时间点分割文本
-        for i, split_point in enumerate([0] + split_points + [duration]):
-            if i < len(split_points) + 1:
-                end_time = target_segment.start_time + (split_points[i] if i < len(split_points) else duration)
-                
-                # 计算当前部分的时间比例
-                time_ratio = (end_time - start_time) / duration if duration > 0 else 1.0 / (len(split_points) + 1)
-                
-                # 按时间比例分割文本
-                text_start = int(len(target_segment.text) * (i / (len(split_points) + 1)))
-                text_end = int(len(target_segment.text) * ((i + 1) / (len(split_points) + 1)))
-                text = target_segment.text[text_start:text_end].strip()
-                
-                new_segment = TranscriptSegment(
-                    id=f"seg_{video_id}_{target_index}_{i}",
-                    video_id=video_id,
-                    text=text,
-                    start_time=start_time,
-                    end_time=end_time,
-                    order=target_segment.order + i
-                )
-                new_segments.append(new_segment)
-                start_time = end_time
+        for i in range(part_count):
+            start_time = target_segment.start_time + boundaries[i]
+            end_time = target_segment.start_time + boundaries[i + 1]
+            
+            raw_text = text[cuts[i]:cuts[i + 1]]
+            part_text = raw_text.strip()
+            part_start = cuts[i] + len(raw_text) - len(raw_text.lstrip())
+            
+            new_segment = TranscriptSegment(
+                id=f"seg_{video_id}_{target_index}_{i}",
+                video_id=video_id,
+                text=part_text,
+                start_time=start_time,
+                end_time=end_time,
+                order=target_segment.order + i
+            )
+            if word_timing:
+                Database.set_word_timing(video_id, new_segment.id,
+                                         word_timing.slice(cuts[i], cuts[i + 1], rebase=part_start))
+            new_segments.append(new_segment)
         
         return new_segments
     
     async def export_video(self, video_id: str, segment_ids: List[str], mode: str, 
                            format: str = "mp4", quality: str = "medium", 
-                           resolution: str = "original") -> str:
+                           resolution: str = "original", workers: int = 1) -> str:
         """导出视频 - 真实视频处理"""
         try:
             # 获取原始视频信息
@@ -912,16 +1522,34 @@ class VideoProcessor:
             
             # 获取质量设置
             quality_settings = self._get_quality_settings(quality, resolution)
+            media_info = self.get_media_info(video_id)
+            self._limit_to_source(quality_settings, media_info)
             
-            if mode == "merge":
-                # 合并模式：将所有片段合并为一个视频
-                await self._merge_segments(video.file_path, ordered_segments, output_path, quality_settings, format)
-            elif mode == "batch":
-                # 批量模式：每个片段生成单独的视频文件
-                await self._export_batch_segments(video.file_path, ordered_segments, output_path, quality_settings, format)
-            else:
-                raise ValueError(f"不支持的导出模式: {mode}")
+            # 按码率估算输出大小，空间不足时在编码前拒绝
+            total_duration = sum(seg.end_time - seg.start_time for seg in ordered_segments)
+            bitrate_bps = int(quality_settings["bitrate"].rstrip("k")) * 1000 + 128000
+            self.storage.ensure_capacity(int(total_duration * bitrate_bps / 8))
+            self.storage.acquire(video_id)
             
+            try:
+                if mode == "merge":
+                    # 合并模式：将所有片段合并为一个视频
+                    merged = False
+                    if workers > 1:
+                        # 分块并行模式：时间线切分为多个连续区间并行编码后无损拼接
+                        snap = video.keyframe_index.snap if video.keyframe_index else None
+                        merged = await self._merge_segments_parallel(video.file_path, ordered_segments, output_path, quality_settings, format, workers, snap, media_info.frame_rate)
+                    if not merged:
+                        await self._merge_segments(video.file_path, ordered_segments, output_path, quality_settings, format)
+                elif mode == "batch":
+                    # 批量模式：每个片段生成单独的视频文件
+                    await self._export_batch_segments(video.file_path, ordered_segments, output_path, quality_settings, format)
+                else:
+                    raise ValueError(f"不支持的导出模式: {mode}")
+            finally:
+                self.storage.release(video_id)
+            
+            self.storage.register(output_path, video_id, "export")
             print(f"视频导出成功: {output_path}")
             return output_path
             
@@ -948,6 +1576,15 @@ class VideoProcessor:
         elif quality == "high":
             settings["bitrate"] = "4000k"
             settings["codec"] = "libx264"
+        elif quality == "preview":
+            # 预览草稿：大幅缩小、最快编码预设、低帧率、低音频码率，仅用于检查剪辑效果
+            settings["bitrate"] = "300k"
+            settings["codec"] = "libx264"
+            settings["preset"] = "ultrafast"
+            settings["fps"] = 12
+            settings["audio_bitrate"] = "48k"
+            settings["height"] = 360
+            return settings
         
         # 分辨率设置
         if resolution == "720p":
@@ -958,6 +1595,19 @@ class VideoProcessor:
         
         return settings
     
+    def _limit_to_source(self, quality_settings: dict, media_info: MediaInfo):
+        """目标分辨率不低于源视频时不缩放，避免无意义的放大和额外编码开销"""
+        if not media_info.height:
+            return
+        if quality_settings.get("resolution"):
+            target_height = int(quality_settings["resolution"].lower().split("x")[1])
+            if target_height >= media_info.height:
+                quality_settings["resolution"] = None
+        if quality_settings.get("height") and quality_settings["height"] >= media_info.height:
+            quality_settings["height"] = None
+        if quality_settings.get("fps") and media_info.frame_rate and quality_settings["fps"] >= media_info.frame_rate:
+            quality_settings["fps"] = None
+    
     async def _merge_segments(self, video_path: str, segments: List, output_path: str, 
                              quality_settings: dict, format: str):
         """合并视频片段"""
@@ -999,16 +1649,13 @@ class VideoProcessor:
             final_clip = concatenate_videoclips(clips)
             
             # 应用质量设置
-            if quality_settings["resolution"]:
-                final_clip = final_clip.resize(quality_settings["resolution"])
+            final_clip = resize_for_export(final_clip, quality_settings)
             
             # 导出视频
             final_clip.write_videofile(
                 output_path,
-                codec=quality_settings["codec"],
-                bitrate=quality_settings["bitrate"],
-                audio_codec=quality_settings["audio_codec"],
                 threads=4,
+                **encoder_options(quality_settings),
                 verbose=False,
                 logger=None
             )
@@ -1039,6 +1686,18 @@ class VideoProcessor:
                 pass
             await self._simulate_export(segments, output_path, "merge")
     
+    async def _merge_segments_parallel(self, video_path: str, segments: List, output_path: str,
+                                       quality_settings: dict, format: str, workers: int, snap=None,
+                                       source_fps: float = 0.0) -> bool:
+        """分块并行合并视频片段，失败或时间线过短时返回 False"""
+        try:
+            ranges = [(segment.start_time, segment.end_time) for segment in segments]
+            return await export_parallel(video_path, ranges, output_path, quality_settings,
+                                         format, workers, self.temp_dir, snap, source_fps)
+        except Exception as e:
+            print(f"分块并行导出失败，回退到单进程导出: {str(e)}")
+            return False
+    
     async def _export_batch_segments(self, video_path: str, segments: List, output_path: str, 
                                     quality_settings: dict, format: str):
         """批量导出视频片段"""
@@ -1068,16 +1727,13 @@ class VideoProcessor:
                     clip = video.subclip(segment.start_time, segment.end_time)
                     
                     # 应用质量设置
-                    if quality_settings["resolution"]:
-                        clip = clip.resize(quality_settings["resolution"])
+                    clip = resize_for_export(clip, quality_settings)
                     
                     # 导出片段
                     clip.write_videofile(
                         segment_path,
-                        codec=quality_settings["codec"],
-                        bitrate=quality_settings["bitrate"],
-                        audio_codec=quality_settings["audio_codec"],
                         threads=2,
+                        **encoder_options(quality_settings),
                         verbose=False,
                         logger=None
                     )
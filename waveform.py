@@ -0,0 +1,125 @@
+"""
+波形峰值金字塔 - 从16kHz PCM计算多级 min/max 峰值，按时间窗口和分辨率读取
+"""
+
+import struct
+import wave
+from typing import List, Tuple
+import numpy as np
+
+# 文件格式: 魔数 + 采样率 + 层数，随后每层 (每峰值采样数, 峰值数)，最后是各层 int8 [min, max] 交错数据
+MAGIC = b"WPK1"
+HEADER = struct.Struct("<4sIH")
+LEVEL_HEADER = struct.Struct("<II")
+
+# 最细一层每个峰值覆盖64个采样（16kHz下每秒250个峰值），之后每层缩小4倍
+BASE_SAMPLES_PER_PEAK = 64
+LEVEL_FACTOR = 4
+LEVEL_COUNT = 6
+
+# 读取PCM时每次处理的采样数，保证长音频不会一次性载入内存
+READ_BLOCK_SAMPLES = BASE_SAMPLES_PER_PEAK * 16384
+
+def _block_peaks(samples: np.ndarray, samples_per_peak: int) -> np.ndarray:
+    """计算每 samples_per_peak 个采样的 min/max，返回 (N, 2) 数组"""
+    count = -(-len(samples) // samples_per_peak)
+    padded = np.empty(count * samples_per_peak, dtype=samples.dtype)
+    padded[:len(samples)] = samples
+    # 用最后一个采样填充尾部，不影响 min/max
+    padded[len(samples):] = samples[-1] if len(samples) else 0
+    blocks = padded.reshape(count, samples_per_peak)
+    return np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1)
+
+def _merge_peaks(peaks: np.ndarray, factor: int) -> np.ndarray:
+    """将相邻 factor 个峰值合并为一个，得到下一层"""
+    count = -(-len(peaks) // factor)
+    padded = np.concatenate([peaks, np.repeat(peaks[-1:], count * factor - len(peaks), axis=0)])
+    blocks = padded.reshape(count, factor, 2)
+    return np.stack([blocks[:, :, 0].min(axis=1), blocks[:, :, 1].max(axis=1)], axis=1)
+
+def build_peak_pyramid(wav_path: str, output_path: str) -> str:
+    """从 extract_audio 生成的 16bit 单声道 WAV 构建峰值金字塔并写入二进制文件"""
+    with wave.open(wav_path, "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError("仅支持16bit单声道PCM")
+        sample_rate = wav.getframerate()
+
+        base_parts = []
+        while True:
+            frames = wav.readframes(READ_BLOCK_SAMPLES)
+            if not frames:
+                break
+            samples = np.frombuffer(frames, dtype="<i2")
+            base_parts.append(_block_peaks(samples, BASE_SAMPLES_PER_PEAK))
+
+    base = np.concatenate(base_parts) if base_parts else np.zeros((1, 2), dtype=np.int16)
+    # 量化到 int8，波形显示不需要更高精度
+    levels = [(base >> 8).astype(np.int8)]
+    for _ in range(LEVEL_COUNT - 1):
+        if len(levels[-1]) <= 1:
+            break
+        levels.append(_merge_peaks(levels[-1], LEVEL_FACTOR))
+
+    with open(output_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, sample_rate, len(levels)))
+        for i, level in enumerate(levels):
+            f.write(LEVEL_HEADER.pack(BASE_SAMPLES_PER_PEAK * LEVEL_FACTOR ** i, len(level)))
+        for level in levels:
+            f.write(level.tobytes())
+
+    return output_path
+
+class PeakPyramid:
+    """内存映射读取峰值金字塔文件"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            magic, self.sample_rate, level_count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("无效的波形文件")
+            level_info = [LEVEL_HEADER.unpack(f.read(LEVEL_HEADER.size)) for _ in range(level_count)]
+
+        offset = HEADER.size + LEVEL_HEADER.size * level_count
+        self.levels: List[Tuple[int, np.ndarray]] = []
+        for samples_per_peak, count in level_info:
+            data = np.memmap(path, dtype=np.int8, mode="r", offset=offset, shape=(count, 2))
+            self.levels.append((samples_per_peak, data))
+            offset += count * 2
+
+    @property
+    def duration(self) -> float:
+        samples_per_peak, data = self.levels[0]
+        return len(data) * samples_per_peak / self.sample_rate
+
+    def window(self, start: float, end: float, pixels: int) -> Tuple[int, np.ndarray]:
+        """
+        读取 [start, end) 秒的波形，最多返回 pixels 个 [min, max] 峰值
+
+        选择能满足分辨率的最粗一层，再把多余的峰值合并到 pixels 个
+        返回 (实际每峰值采样数, int8 数组)
+        """
+        start = max(0.0, start)
+        end = min(end, self.duration)
+        if end <= start or pixels <= 0:
+            return self.levels[0][0], np.zeros((0, 2), dtype=np.int8)
+
+        window_samples = (end - start) * self.sample_rate
+        samples_per_peak, data = self.levels[0]
+        for level_spp, level_data in self.levels:
+            if window_samples / level_spp < pixels:
+                break
+            samples_per_peak, data = level_spp, level_data
+
+        first = int(start * self.sample_rate // samples_per_peak)
+        last = min(len(data), int(-(-end * self.sample_rate // samples_per_peak)))
+        peaks = np.asarray(data[first:last])
+
+        if len(peaks) > pixels:
+            bounds = np.linspace(0, len(peaks), pixels + 1).astype(np.int64)[:-1]
+            peaks = np.stack([
+                np.minimum.reduceat(peaks[:, 0], bounds),
+                np.maximum.reduceat(peaks[:, 1], bounds),
+            ], axis=1)
+            samples_per_peak = int(round(window_samples / pixels))
+
+        return samples_per_peak, peaks
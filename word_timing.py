@@ -0,0 +1,106 @@
+"""
+词级时间戳 - 识别结果携带每个词的起止时间，片段内建立字符偏移与时间的有序索引，
+按文本或时间分割片段时可以精确定位切点
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Tuple
+
+# 词级时间戳: (词, 开始秒, 结束秒)，均为原视频上的绝对时间
+Word = Tuple[str, float, float]
+
+class TimedText(tuple):
+    """
+    (文本, 开始秒, 结束秒) 识别结果，附带词级时间戳 words
+
+    仍是三元组，原有按三元组解包的代码不受影响
+    """
+
+    def __new__(cls, text: str, start: float, end: float, words: Optional[List[Word]] = None):
+        item = super().__new__(cls, (text, start, end))
+        item.words = list(words or [])
+        return item
+
+    def __getnewargs__(self):
+        # 本地引擎在工作进程中生成结果，需要能被 pickle
+        return (self[0], self[1], self[2], self.words)
+
+def words_of(result: Tuple[str, float, float]) -> List[Word]:
+    """识别结果的词级时间戳，普通三元组返回空列表"""
+    return getattr(result, "words", [])
+
+def shift_result(result: Tuple[str, float, float], delta: float) -> Tuple[str, float, float]:
+    """把分段识别的相对时间平移到原视频时间轴，词级时间戳一起平移"""
+    text, start, end = result
+    words = [(word, word_start + delta, word_end + delta) for word, word_start, word_end in words_of(result)]
+    return TimedText(text, start + delta, end + delta, words)
+
+class WordTimingIndex:
+    """
+    一个片段内按顺序排列的词：字符偏移、开始时间、结束时间三个紧凑数组
+
+    字符偏移和开始时间都单调递增，所有查询都是 O(log n) 的二分查找
+    """
+
+    def __init__(self, offsets: array, starts: array, ends: array, text_length: int):
+        self.offsets = offsets
+        self.starts = starts
+        self.ends = ends
+        self.text_length = text_length
+
+    @classmethod
+    def from_words(cls, text: str, words: List[Word]) -> Optional["WordTimingIndex"]:
+        """在片段文本中依次定位每个词（识别结果的词不含标点），找不到的词沿用上一个位置"""
+        offsets, starts, ends = array("I"), array("d"), array("d")
+        cursor = 0
+        last_start = float("-inf")
+        for word, word_start, word_end in words:
+            word = word.strip()
+            if not word:
+                continue
+            position = text.find(word, cursor)
+            if position < 0:
+                position = cursor
+            else:
+                cursor = position + len(word)
+            # 保持单调，避免识别结果中偶发的时间回退破坏二分查找
+            word_start = max(word_start, last_start)
+            offsets.append(position)
+            starts.append(word_start)
+            ends.append(max(word_end, word_start))
+            last_start = word_start
+        if not offsets:
+            return None
+        return cls(offsets, starts, ends, len(text))
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def char_at_time(self, t: float) -> int:
+        """时间 t 正在说的词在文本中的字符偏移"""
+        i = bisect_right(self.starts, t) - 1
+        return self.offsets[max(i, 0)]
+
+    def cut_char(self, t: float) -> int:
+        """在时间 t 切开片段时文本的切点：t 之后开始的第一个词的字符偏移"""
+        i = bisect_left(self.starts, t)
+        return self.offsets[i] if i < len(self.offsets) else self.text_length
+
+    def time_at_char(self, offset: float) -> float:
+        """在字符偏移 offset 处切开文本时的切点时间：前一个词结束与后一个词开始的中点"""
+        i = bisect_left(self.offsets, offset)
+        if i == 0:
+            return self.starts[0]
+        if i >= len(self.offsets):
+            return self.ends[-1]
+        return (self.ends[i - 1] + self.starts[i]) / 2
+
+    def slice(self, char_start: int, char_end: int, rebase: int = 0) -> Optional["WordTimingIndex"]:
+        """取出字符范围 [char_start, char_end) 内的词，字符偏移减去 rebase"""
+        lo = bisect_left(self.offsets, char_start)
+        hi = bisect_left(self.offsets, char_end)
+        if lo >= hi:
+            return None
+        offsets = array("I", (max(offset - rebase, 0) for offset in self.offsets[lo:hi]))
+        return WordTimingIndex(offsets, self.starts[lo:hi], self.ends[lo:hi], max(char_end - rebase, 0))
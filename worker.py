@@ -0,0 +1,133 @@
+"""
+处理 worker - 从共享任务队列领取处理任务，运行 VideoProcessor 的处理流程
+
+API 节点设置 PROCESSING_MODE=queue 后只负责上传、编辑和导出，处理交给任意数量的 worker：
+
+    python worker.py
+
+worker 与 API 节点需要共享 UPLOAD_DIR 和 JOB_QUEUE_PATH；JOB_STORE_PATH 也放在共享位置
+（并设置 JOB_STORE_SHARED=1，网络文件系统上不能使用 WAL）时，接管失联 worker 的任务可以从其识别检查点继续。配置了 ASR_CALLBACK_URL 时，
+回调由 API 节点写入队列数据库，worker 定时取走自己正在等待的结果
+"""
+
+import os
+import socket
+import asyncio
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+from models import Video, Database, ProcessingTask
+from video_processor import VideoProcessor, ASR_CALLBACK_URL
+from job_queue import JobQueue, QueuedJob, JOB_HEARTBEAT_SECONDS, dump_transcript, dump_keyframes
+
+# 每个 worker 进程同时处理的任务数
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 1))
+# 队列为空时的轮询间隔（秒）
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", 2))
+
+async def _heartbeat(queue: JobQueue, job: QueuedJob, worker_id: str, task: ProcessingTask,
+                     processing: asyncio.Task):
+    """定时续约并回写进度；片段有变化时一并回写，API 节点可以先展示已识别的部分"""
+    loop = asyncio.get_running_loop()
+    published = 0
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        count = len(Database.get_transcript(job.video_id))
+        segments = dump_transcript(job.video_id) if count != published else None
+        alive = await loop.run_in_executor(None, queue.heartbeat, job.video_id, worker_id,
+                                           task.progress, task.message or "", segments)
+        if not alive:
+            print(f"任务 {job.video_id} 的租约已被其他 worker 接管，停止处理")
+            processing.cancel()
+            return
+        published = count
+
+async def run_job(processor: VideoProcessor, queue: JobQueue, job: QueuedJob, worker_id: str):
+    """在本进程中运行一个任务，结束后把片段和产物路径回写到队列"""
+    loop = asyncio.get_running_loop()
+    video = Video(
+        id=job.video_id,
+        filename=job.filename,
+        file_path=job.file_path,
+        size=job.size,
+        upload_time=job.upload_time
+    )
+    Database.add_video(video)
+    task = ProcessingTask(
+        video_id=job.video_id,
+        status="processing",
+        progress=0,
+        message=f"已由 {worker_id} 开始处理..."
+    )
+    Database.add_processing_task(task)
+
+    # 首次领取时新建检查点；重新领取（前一个 worker 失联）时从检查点继续
+    resume = job.attempts > 1
+    if not resume:
+        processor.jobs.create(video, worker_id, job.cost)
+    print(f"领取任务 {job.video_id}（第 {job.attempts} 次）")
+
+    processing = asyncio.create_task(processor.process_video(job.video_id, job.file_path, resume=resume))
+    heartbeat = asyncio.create_task(_heartbeat(queue, job, worker_id, task, processing))
+    try:
+        await processing
+    except asyncio.CancelledError:
+        if heartbeat.done():
+            # 租约丢失，任务已由其他 worker 负责
+            Database.remove_video(job.video_id)
+            return
+        raise
+    finally:
+        heartbeat.cancel()
+
+    status = "completed" if task.status == "completed" else "failed"
+    await loop.run_in_executor(
+        None, queue.finish, job.video_id, worker_id, status, task.message or "",
+        dump_transcript(job.video_id), video.duration, video.proxy_path, video.waveform_path,
+        dump_keyframes(video.keyframe_index)
+    )
+    print(f"任务 {job.video_id} 结束: {task.message}")
+    # 结果已回写到队列，本进程的内存记录不再需要
+    Database.remove_video(job.video_id)
+
+async def _relay_callbacks(processor: VideoProcessor, queue: JobQueue):
+    """把 API 节点收到的识别回调交给本进程中等待的识别线程"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(WORKER_POLL_INTERVAL)
+        try:
+            completions = await loop.run_in_executor(None, queue.take_completions,
+                                                     processor.asr_callbacks.waiting())
+        except Exception as e:
+            print(f"读取识别回调失败: {e}")
+            continue
+        for completion in completions:
+            processor.asr_callbacks.complete(completion)
+
+async def worker_loop(processor: VideoProcessor, queue: JobQueue, worker_id: str):
+    loop = asyncio.get_running_loop()
+    while True:
+        job = await loop.run_in_executor(None, queue.claim, worker_id)
+        if job is None:
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+            continue
+        try:
+            await run_job(processor, queue, job, worker_id)
+        except Exception as e:
+            # 回写失败等意外错误不终止 worker，租约过期后任务会被重新领取
+            print(f"任务 {job.video_id} 运行异常: {e}")
+
+async def main():
+    processor = VideoProcessor()
+    queue = JobQueue()
+    host = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"worker {host} 启动，并发 {WORKER_CONCURRENCY}，队列 {queue.path}")
+    loops = [worker_loop(processor, queue, f"{host}:{i}") for i in range(WORKER_CONCURRENCY)]
+    if ASR_CALLBACK_URL:
+        loops.append(_relay_callbacks(processor, queue))
+    await asyncio.gather(*loops)
+
+if __name__ == "__main__":
+    asyncio.run(main())